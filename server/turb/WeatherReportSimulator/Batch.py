@@ -0,0 +1,151 @@
+from datetime import timedelta
+import json
+import os
+import time
+import numpy as np
+from .Engine import SimulationEngine
+from .Simulator import ReportBatch, WeatherReportSimulator
+
+
+class ChunkWriter:
+    """Streams the flights and weather reports of a simulation into a directory of compressed
+    columnar chunks. Chunk k is written as flights_k.npz and reports_k.npz, with one array per
+    column, and a metadata.json describing the run is written when the writer is closed.
+
+    Flights are written once, when they depart. Reports refer to flights by their integer id.
+    """
+
+    VERSION = 2
+    FLIGHT_COLUMNS = ('id', 'origin', 'dest', 'aircraft', 'start_time', 'end_time')
+
+    def __init__(self, path: str, chunk_size: int=2 ** 20):
+        """Creates a new writer. The output directory is created if it does not exist.
+
+        :param path: Directory to write chunks to.
+        :param chunk_size: Number of reports buffered before a chunk is written.
+        """
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._chunk_size = chunk_size
+        self._flights = []
+        self._reports = []
+        self._num_buffered = 0
+        self._num_chunks = 0
+        self._num_flights = 0
+        self._num_reports = 0
+
+    def write(self, sim):
+        """Buffers the flights departed and reports generated in the last iteration of a
+        simulation, and writes a chunk once enough reports are buffered.
+
+        :param sim: WeatherReportSimulator or SimulationEngine which has just progressed.
+        """
+        self._flights.extend(sim.new_flights)
+        reports = sim.new_reports
+        if len(reports) > 0:
+            self._reports.append(reports)
+            self._num_buffered += len(reports)
+        if self._num_buffered >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered flights and reports as a new chunk, if any are buffered."""
+        if not self._flights and not self._reports:
+            return
+        flights = self._flights
+        self._save('flights', {
+            'id': np.array([flight.id for flight in flights], dtype=np.int64),
+            'origin': np.array([flight.origin.code for flight in flights], dtype=str),
+            'dest': np.array([flight.dest.code for flight in flights], dtype=str),
+            'aircraft': np.array([flight.plane.name for flight in flights], dtype=str),
+            'start_time': np.array([flight.start_time for flight in flights], dtype='datetime64[us]'),
+            'end_time': np.array([flight.end_time for flight in flights], dtype='datetime64[us]'),
+        })
+        reports = ReportBatch.concatenate(self._reports)
+        self._save('reports', {column: getattr(reports, column) for column in ReportBatch.COLUMNS})
+        self._num_chunks += 1
+        self._num_flights += len(flights)
+        self._num_reports += len(reports)
+        self._flights = []
+        self._reports = []
+        self._num_buffered = 0
+
+    def close(self, **metadata):
+        """Writes any buffered data and the metadata of the run.
+
+        :param metadata: JSON serializable values to store with the run.
+        """
+        self.flush()
+        metadata.update(version=self.VERSION, chunks=self._num_chunks,
+                        flights=self._num_flights, reports=self._num_reports,
+                        flight_columns=self.FLIGHT_COLUMNS, report_columns=ReportBatch.COLUMNS)
+        with open(os.path.join(self._path, 'metadata.json'), 'w') as file:
+            json.dump(metadata, file, indent=2)
+        return metadata
+
+    def _save(self, name: str, columns: dict):
+        path = os.path.join(self._path, '{}_{:05d}.npz'.format(name, self._num_chunks))
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as file:
+            np.savez_compressed(file, **columns)
+        os.replace(tmp_path, path)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def num_chunks(self):
+        return self._num_chunks
+
+    @property
+    def num_reports(self):
+        """Number of reports written so far, including buffered reports."""
+        return self._num_reports + self._num_buffered
+
+
+def simulate(path: str, duration: timedelta, time_step: timedelta=timedelta(minutes=5),
+             flight_time: float=10, report_time: float=20, num_processes: int=1, seed=None,
+             chunk_size: int=2 ** 20, progress=None):
+    """Runs a simulation for a given simulated duration as fast as possible, without a database,
+    and writes its flights and weather reports to a directory of compressed chunks.
+
+    :param path: Directory to write chunks to.
+    :param duration: Simulated time to run for.
+    :param time_step: Simulated time per iteration. Longer steps are faster, but flights only
+                      move and are only chosen to send reports once per iteration.
+    :param flight_time: Expected time between flights in seconds.
+    :param report_time: Expected time between weather reports in seconds.
+    :param num_processes: Number of worker processes to shard the simulation over. With a single
+                          process the simulation runs in the calling process.
+    :param seed: Integer seed of the simulation, or None to seed it from fresh entropy.
+    :param progress: Optional function called after every chunk with the simulated time and
+                     the number of reports written.
+    :return: Dictionary with the metadata of the run.
+    """
+    seed = np.random.SeedSequence(seed)
+    if num_processes > 1:
+        sim = SimulationEngine(flight_time, report_time, num_processes, seed)
+        sim.start()
+    else:
+        sim = WeatherReportSimulator.get_simulator(flight_time, report_time, seed=seed)
+    writer = ChunkWriter(path, chunk_size)
+    start_time = sim.current_time
+    stop_time = start_time + duration
+    started = time.time()
+    try:
+        while sim.current_time < stop_time:
+            chunks = writer.num_chunks
+            sim.progress(min(time_step, stop_time - sim.current_time))
+            writer.write(sim)
+            if progress is not None and writer.num_chunks > chunks:
+                progress(sim.current_time, writer.num_reports)
+    finally:
+        if num_processes > 1:
+            sim.stop()
+        else:
+            sim.close()
+    return writer.close(start_time=start_time.isoformat(), stop_time=sim.current_time.isoformat(),
+                        time_step=time_step.total_seconds(), flight_time=flight_time,
+                        report_time=report_time, processes=num_processes, seed=seed.entropy,
+                        elapsed=time.time() - started)
@@ -0,0 +1,324 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+import json
+import multiprocessing
+import traceback
+import numpy as np
+import os
+import shutil
+from .Simulator import Flight, ReportBatch, WeatherReportSimulator
+from .Weather_Data.Weather_Fun import SharedWeather
+
+
+# Results of one shard progressing by one iteration. Flights are pickled with their current
+# positions, and positions of the flights which are still active are sent as arrays.
+ShardResult = namedtuple('ShardResult', ['time', 'new_flights', 'flight_ids', 'lat', 'lon',
+                                         'bearing', 'removed_flights', 'new_reports'])
+
+
+class ShardError(RuntimeError):
+    """Raised by the coordinator when a shard's worker process fails."""
+
+
+def _shard_result(sim, new_flights, removed_flights, new_reports):
+    table = sim.flight_table
+    n = len(table)
+    return ShardResult(sim.current_time, new_flights,
+                       table.ids.copy(),
+                       table.lat[:n], table.lon[:n], table.bearing[:n],
+                       removed_flights, new_reports)
+
+
+def run_shard(connection, shard: int, num_shards: int, flight_time: float, report_time: float,
+              seed: np.random.SeedSequence, weather: dict, state: str=None):
+    """Runs one shard of a simulation in a worker process. The worker builds its own simulator,
+    sends a ShardResult with its active flights over the connection, along with its retained
+    reports and landed flights if it continues from a saved state, then handles commands until
+    it receives None. A ('progress', time delta) command progresses the simulator and sends back
+    a ShardResult, and a ('save', path) command saves its state and sends back the path.
+
+    :param connection: Connection to the coordinator.
+    :param shard: Index of this shard.
+    :param num_shards: Total number of shards.
+    :param flight_time: Expected time between flights of this shard in seconds.
+    :param report_time: Expected time between weather reports of this shard in seconds.
+    :param seed: Seed of this shard's random number generators.
+    :param weather: Handle of the SharedWeather created by the coordinator.
+    :param state: Path of a saved state to continue from, or None to start a new simulation.
+    """
+    shared_weather = None
+    sim = None
+    try:
+        shared_weather = SharedWeather.attach(weather)
+        # Interleave flight ids so that they are unique across shards
+        Flight.uid = shard
+        Flight.uid_step = num_shards
+        sim = WeatherReportSimulator.get_simulator(flight_time, report_time, seed=seed,
+                                                    weather=shared_weather)
+        if state is None:
+            connection.send(_shard_result(sim, sim.current_flights, [], ReportBatch.empty()))
+        else:
+            # A restored shard resends its retained reports, with the landed flights sending them
+            sim.load_state(state)
+            connection.send(_shard_result(sim, sim.current_flights, sim.landed_flights,
+                                          sim.current_reports))
+        while True:
+            command = connection.recv()
+            if command is None:
+                break
+            name, argument = command
+            if name == 'progress':
+                sim.progress(argument)
+                connection.send(_shard_result(sim, sim.new_flights, sim.removed_flights,
+                                              sim.new_reports))
+            elif name == 'save':
+                sim.save_state(argument)
+                connection.send(argument)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception:
+        connection.send(ShardError('Simulation shard {} failed:\n{}'.format(
+            shard, traceback.format_exc())))
+    finally:
+        connection.close()
+        if sim is not None:
+            sim.close()
+        if shared_weather is not None:
+            shared_weather.close()
+
+
+class SimulationEngine:
+    """Runs a simulation split into shards, each simulating its share of the flights and weather
+    reports in its own worker process, and merges the results of every iteration.
+
+    The simulation is partitioned by flight rate: each of N shards generates flights N times less
+    often and reports N times less often over its own flights, so the shards together match a
+    single simulation with the given rates. Every shard draws from an independent random stream
+    spawned from one seed, so a run is reproducible for a given seed and number of shards.
+
+    The coordinator finds the weather data and loads its grid raster once, sharing the raster
+    through shared memory, and every worker opens the weather data by its paths. Converted
+    weather directories are memory-mapped, so the page cache holds a single copy of them for all
+    workers, and netCDF files are only read a sliding window of time steps at a time.
+
+    The state of every shard can be saved with save_state, and an engine continuing from a
+    saved state is created with from_state.
+    """
+
+    def __init__(self, flight_time: float, report_time: float, num_shards: int=None, seed=None):
+        """Creates a new engine. Worker processes are not started until start is called.
+
+        :param flight_time: Expected time between flights in seconds.
+        :param report_time: Expected time between weather reports in seconds.
+        :param num_shards: Number of worker processes, or None to use one per CPU.
+        :param seed: Integer or numpy SeedSequence to seed the simulation with, or None to seed
+                     it from fresh entropy.
+        """
+        self._flight_time = flight_time
+        self._report_time = report_time
+        self._num_shards = num_shards or os.cpu_count() or 1
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self._seed = seed
+        self._processes = []
+        self._connections = []
+        self._weather = None
+        self._current_time = None
+        # Active flights of all shards by id, whose positions are updated every iteration
+        self._flights = {}
+        self._new_flights = []
+        self._removed_flights = []
+        self._new_reports = ReportBatch.empty()
+        self._state = None
+
+    @classmethod
+    def from_state(cls, path: str):
+        """Creates an engine which continues from a state saved by save_state when it is started.
+
+        :param path: Directory the state was saved to.
+        :return: New engine with the saved configuration.
+        """
+        with open(os.path.join(path, 'engine.json')) as file:
+            config = json.load(file)
+        engine = cls(config['flight_time'], config['report_time'], config['num_shards'],
+                     np.random.SeedSequence(config['seed']))
+        engine._state = path
+        return engine
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+    def start(self):
+        """Shares the weather with the workers, starts the worker processes and waits until all
+        of them have loaded their simulators. The active flights of every shard are then the new
+        flights, and if the engine continues from a saved state, the retained reports are the new
+        reports and the landed flights which sent them are the removed flights."""
+        if self._processes:
+            return
+        paths = WeatherReportSimulator.weather_paths()
+        self._weather = SharedWeather.create(paths, WeatherReportSimulator.load_grid(paths))
+        context = multiprocessing.get_context('spawn')
+        n = self._num_shards
+        for shard, seed in enumerate(self._seed.spawn(n)):
+            state = None if self._state is None else self._shard_path(self._state, shard)
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=run_shard, daemon=True,
+                                      args=(worker_connection, shard, n, self._flight_time * n,
+                                            self._report_time * n, seed, self._weather.handle,
+                                            state))
+            process.start()
+            worker_connection.close()
+            self._processes.append(process)
+            self._connections.append(connection)
+        self._merge(self._receive_all())
+
+    def progress(self, d_time: timedelta):
+        """Progresses every shard by the given time and merges their results.
+
+        :param d_time: Simulated time to progress by.
+        """
+        for connection in self._connections:
+            connection.send(('progress', d_time))
+        self._merge(self._receive_all())
+
+    def save_state(self, path: str):
+        """Saves the state of every shard, and the configuration of this engine, to a directory.
+        The engine must be started.
+
+        :param path: Directory to save to. It is replaced if it already exists, by moving it aside
+                     first, so the directory holds either the old or the new state as a whole.
+        """
+        tmp_path = '{}.{}.tmp'.format(path.rstrip(os.sep), os.getpid())
+        old_path = '{}.{}.old'.format(path.rstrip(os.sep), os.getpid())
+        os.makedirs(tmp_path)
+        for shard, connection in enumerate(self._connections):
+            connection.send(('save', self._shard_path(tmp_path, shard)))
+        self._receive_all()
+        with open(os.path.join(tmp_path, 'engine.json'), 'w') as file:
+            json.dump({'flight_time': self._flight_time, 'report_time': self._report_time,
+                       'num_shards': self._num_shards, 'seed': self._seed.entropy,
+                       'time': self._current_time.isoformat()}, file, indent=2)
+        if os.path.isdir(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path)
+
+    @staticmethod
+    def _shard_path(path: str, shard: int):
+        return os.path.join(path, 'shard_{}.npz'.format(shard))
+
+    def _merge(self, results):
+        new_flights = []
+        removed_flights = []
+        for result in results:
+            for flight in result.new_flights:
+                self._flights[flight.id] = flight
+            new_flights.extend(result.new_flights)
+            for flight_id, lat, lon, bearing in zip(result.flight_ids.tolist(), result.lat.tolist(),
+                                                    result.lon.tolist(), result.bearing.tolist()):
+                self._flights[flight_id].set_position(lat, lon, bearing)
+            for flight in result.removed_flights:
+                known = self._flights.pop(flight.id, flight)
+                known.set_position(flight.lat, flight.lon, flight.bearing)
+                removed_flights.append(known)
+
+        new_reports = ReportBatch.concatenate([result.new_reports for result in results])
+        self._new_reports = new_reports[np.argsort(new_reports.time, kind='stable')]
+        self._new_flights = new_flights
+        self._removed_flights = removed_flights
+        self._current_time = results[0].time
+
+    def stop(self):
+        """Stops the worker processes and frees the shared weather. The engine cannot be started
+        again once stopped."""
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        if self._weather is not None:
+            self._weather.close()
+            self._weather = None
+
+    def _receive_all(self):
+        results = []
+        for connection in self._connections:
+            try:
+                result = connection.recv()
+            except EOFError:
+                result = ShardError('Simulation shard exited unexpectedly.')
+            if isinstance(result, ShardError):
+                self.stop()
+                raise result
+            results.append(result)
+        return results
+
+    @property
+    def flight_time(self):
+        return self._flight_time
+
+    @property
+    def report_time(self):
+        return self._report_time
+
+    @property
+    def num_shards(self):
+        return self._num_shards
+
+    @property
+    def seed(self):
+        """SeedSequence that the shards' random streams are spawned from."""
+        return self._seed
+
+    @property
+    def weather(self):
+        """SharedWeather read by the worker processes, or None if the engine is not running."""
+        return self._weather
+
+    @property
+    def current_time(self) -> datetime:
+        return self._current_time
+
+    @property
+    def current_flights(self):
+        """Gets the currently active flights of all shards.
+
+        :return: List of the current active flights
+        """
+        return list(self._flights.values())
+
+    @property
+    def new_flights(self):
+        """Gets the flights which have departed in the last iteration.
+
+        :return: List of the new flights
+        """
+        return self._new_flights
+
+    @property
+    def removed_flights(self):
+        """Gets the flights which have completed in the last iteration.
+
+        :return: List of the completed flights
+        """
+        return self._removed_flights
+
+    @property
+    def new_reports(self):
+        """Gets the reports of all shards generated in the last iteration.
+
+        :return: ReportBatch of the new reports, in time order
+        """
+        return self._new_reports
@@ -0,0 +1,97 @@
+import numpy as np
+
+
+EARTH_RADIUS = 6371000  # mean radius of the Earth in meters
+
+
+def to_unit_vectors(lats, lons):
+    """Converts latitudes and longitudes in degrees to 3D coordinates on the unit sphere.
+
+    :param lats: Latitude or array of latitudes
+    :param lons: Longitude or array of longitudes
+    :return: Array of shape (..., 3) containing the x, y and z coordinates
+    """
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lats)
+    return np.stack((cos_lat * np.cos(lons), cos_lat * np.sin(lons), np.sin(lats)), axis=-1)
+
+
+def from_unit_vectors(points):
+    """Converts 3D coordinates to latitudes and longitudes in degrees. The coordinates do not
+    need to be normalized.
+
+    :param points: Array of shape (..., 3) containing the x, y and z coordinates
+    :return: Tuple of the latitudes and longitudes
+    """
+    points = np.asarray(points, dtype=np.float64)
+    x, y, z = points[..., 0], points[..., 1], points[..., 2]
+    return np.degrees(np.arctan2(z, np.hypot(x, y))), np.degrees(np.arctan2(y, x))
+
+
+def get_angular_distance(lat1, lon1, lat2, lon2):
+    """
+    Returns the angular great circle distance from the first
+    coordinate to the second coordinate
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * \
+        np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    a = np.clip(a, 0, 1)
+    return 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def get_vector_angle(points1, points2):
+    """
+    Returns the angular great circle distance between unit vectors
+    """
+    cross = np.linalg.norm(np.cross(points1, points2), axis=-1)
+    return np.arctan2(cross, np.sum(points1 * points2, axis=-1))
+
+
+def get_distance(lat1, lon1, lat2, lon2, alt):
+    """
+    Returns the great circle distance in meters from the first
+    coordinate to the second coordinate at the given altitude
+    """
+    r = EARTH_RADIUS + np.asarray(alt)  # radius from center of Earth in meters
+    return r * get_angular_distance(lat1, lon1, lat2, lon2)
+
+
+def interpolate_vectors(points1, points2, angle, x):
+    """
+    Returns the unit vectors on the great circles between the given unit
+    vectors, separated by the given angles, that are x proportion from the
+    first to the second. Identical endpoints return the endpoint itself
+    """
+    angle = np.asarray(angle, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    sin_angle = np.sin(angle)
+    degenerate = sin_angle == 0
+    safe_sin = np.where(degenerate, 1, sin_angle)
+    a = np.where(degenerate, 1 - x, np.sin((1 - x) * angle) / safe_sin)
+    b = np.where(degenerate, x, np.sin(x * angle) / safe_sin)
+    return a[..., None] * points1 + b[..., None] * points2
+
+
+def get_inter_point(lat1, lon1, lat2, lon2, x):
+    """
+    Returns the intermediate point between the two given points
+    on the great circle that is x proportion from the first to the second
+    """
+    points1 = to_unit_vectors(lat1, lon1)
+    points2 = to_unit_vectors(lat2, lon2)
+    angle = get_angular_distance(lat1, lon1, lat2, lon2)
+    return from_unit_vectors(interpolate_vectors(points1, points2, angle, x))
+
+
+def get_bearing(lat1, lon1, lat2, lon2):
+    """
+    Returns the great circle bearing in degrees from the first
+    coordinate to the second coordinate
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    y = np.sin(lon2 - lon1) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * \
+        np.cos(lat2) * np.cos(lon2 - lon1)
+    return np.degrees(np.arctan2(y, x))
@@ -0,0 +1,87 @@
+"""Compares the vectorized functions in Geodesy with the scalar math versions they replaced.
+
+Run from the server directory with: python -m turb.WeatherReportSimulator.Geodesy_Benchmark
+"""
+import math
+import timeit
+import numpy as np
+from . import Geodesy
+
+
+def get_angular_distance(lat1, lon1, lat2, lon2):
+    lat1 = math.radians(lat1)
+    lon1 = math.radians(lon1)
+    lat2 = math.radians(lat2)
+    lon2 = math.radians(lon2)
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2)**2 + math.cos(lat1) * \
+        math.cos(lat2) * math.sin(dlon / 2)**2
+    return 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def get_distance(lat1, lon1, lat2, lon2, alt):
+    return (6371000 + alt) * get_angular_distance(lat1, lon1, lat2, lon2)
+
+
+def get_inter_point(lat1, lon1, lat2, lon2, x):
+    d = get_angular_distance(lat1, lon1, lat2, lon2)
+    lat1 = math.radians(lat1)
+    lon1 = math.radians(lon1)
+    lat2 = math.radians(lat2)
+    lon2 = math.radians(lon2)
+    a = math.sin((1 - x) * d) / math.sin(d)
+    b = math.sin(x * d) / math.sin(d)
+    x = a * math.cos(lat1) * math.cos(lon1) + b * \
+        math.cos(lat2) * math.cos(lon2)
+    y = a * math.cos(lat1) * math.sin(lon1) + b * \
+        math.cos(lat2) * math.sin(lon2)
+    z = a * math.sin(lat1) + b * math.sin(lat2)
+    return math.degrees(math.atan2(z, math.sqrt(x**2 + y**2))), math.degrees(math.atan2(y, x))
+
+
+def get_bearing(lat1, lon1, lat2, lon2):
+    lat1 = math.radians(lat1)
+    lon1 = math.radians(lon1)
+    lat2 = math.radians(lat2)
+    lon2 = math.radians(lon2)
+    y = math.sin(lon2 - lon1) * math.cos(lat2)
+    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * \
+        math.cos(lat2) * math.cos(lon2 - lon1)
+    return math.degrees(math.atan2(y, x))
+
+
+def benchmark(n: int=10000, repeat: int=5):
+    """Times each function on n random coordinate pairs and checks that both versions agree.
+
+    :param n: Number of coordinate pairs.
+    :param repeat: Number of timing runs, of which the fastest is reported.
+    """
+    rng = np.random.RandomState(0)
+    lat1, lat2 = rng.uniform(-80, 80, (2, n))
+    lon1, lon2 = rng.uniform(-180, 180, (2, n))
+    x = rng.uniform(0, 1, n)
+    alt = np.full(n, 6000.0)
+    cases = [('get_angular_distance', (lat1, lon1, lat2, lon2)),
+             ('get_distance', (lat1, lon1, lat2, lon2, alt)),
+             ('get_inter_point', (lat1, lon1, lat2, lon2, x)),
+             ('get_bearing', (lat1, lon1, lat2, lon2))]
+    print('{:<22}{:>14}{:>14}{:>10}{:>14}'.format(
+        'function', 'scalar (us)', 'vector (us)', 'speedup', 'max error'))
+    for name, args in cases:
+        scalar = globals()[name]
+        vector = getattr(Geodesy, name)
+        rows = list(zip(*[a.tolist() for a in args]))
+        scalar_time = min(timeit.repeat(lambda: [scalar(*row) for row in rows],
+                                        number=1, repeat=repeat))
+        vector_time = min(timeit.repeat(lambda: vector(*args), number=1, repeat=repeat))
+        expected = np.array([scalar(*row) for row in rows])
+        actual = np.array(vector(*args))
+        actual = actual.T if actual.ndim > 1 else actual
+        print('{:<22}{:>14.1f}{:>14.1f}{:>10.1f}{:>14.2e}'.format(
+            name, 1e6 * scalar_time, 1e6 * vector_time, scalar_time / vector_time,
+            np.max(np.abs(expected - actual))))
+
+
+if __name__ == '__main__':
+    benchmark()
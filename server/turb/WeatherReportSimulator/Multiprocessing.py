@@ -0,0 +1,229 @@
+from .Engine import SimulationEngine
+from ..models import *
+from ..db_interface import *
+import threading
+import time
+from datetime import timedelta
+
+
+class SimulationProcessManager:
+    """Runs a flight simulation across multiple worker processes.
+    Provides methods to start, stop, pause and unpause the simulation.
+    """
+
+    def __init__(self, flight_time, report_time, update_time, time_per_update, num_processes=None,
+                 seed=None, checkpoint=None, checkpoint_interval=300, restore=False):
+        """
+        Creates a new process manager. The worker processes are started by the start method.
+
+        :param flight_time: Expected time between flights in seconds
+        :param report_time: Expected time between weather reports in seconds
+        :param update_time: Minimum real time between iterations of the simulation in seconds
+        :param time_per_update: Simulated time per iteration in seconds
+        :param num_processes: Total number of worker processes used, or None to use one per CPU
+        :param seed: Seed of the simulation, or None to seed it from fresh entropy
+        :param checkpoint: Directory the state of the simulation is saved to periodically and
+                           when it stops, or None to not save it
+        :param checkpoint_interval: Minimum real time between saves in seconds
+        :param restore: Whether to continue from the state saved in the checkpoint directory.
+                        The saved flight time, report time, number of processes and seed are used
+        """
+        if restore:
+            engine = SimulationEngine.from_state(checkpoint)
+        else:
+            engine = SimulationEngine(flight_time, report_time, num_processes, seed)
+        self.flight_time = engine.flight_time
+        self.report_time = engine.report_time
+        self.update_time = update_time
+        self.time_per_update = time_per_update
+        self.num_processes = engine.num_shards
+        self._paused = False
+        self._stopped = False
+        self._running = False
+        self._engine = engine
+        self._thread = SimulationThread(engine, update_time, time_per_update, checkpoint,
+                                        checkpoint_interval)
+
+    def start(self):
+        """Starts the simulation held by this manager."""
+        if self._running:
+            return
+        WeatherReport.objects.all().delete()
+        Flight.objects.all().delete()
+        Aircraft.objects.all().delete()
+        Airport.objects.all().delete()
+        clear_identity_map()
+        live_state.clear()
+        self._thread.start()
+        self._running = True
+
+    def stop(self):
+        """Stops the simulation held by this manager, and waits until its final checkpoint has been
+        saved and everything it pushed has been written to the database."""
+        if self._stopped:
+            return
+        self._thread.stop()
+        self._stopped = True
+        self._running = False
+
+    def checkpoint(self):
+        """Saves the state of the simulation held by this manager to its checkpoint directory."""
+        self._thread.checkpoint()
+
+    def pause(self):
+        """Pauses the simulation held by this manager."""
+        if self._paused:
+            return
+        self._thread.pause()
+        self._paused = True
+
+    def unpause(self):
+        """Unpauses the simulation held by this manager."""
+        if not self._paused:
+            return
+        self._thread.unpause()
+        self._paused = False
+
+    @property
+    def metrics(self):
+        """Statistics of the database writer of the simulation held by this manager."""
+        return self._thread.metrics
+
+    @property
+    def paused(self): return self._paused
+
+    @property
+    def running(self): return self._running
+
+    @property
+    def stopped(self): return self._stopped
+
+
+class SimulationThread(threading.Thread):
+    """Thread coordinating a simulation engine, which hands the merged results of each of its
+    iterations to a DatabaseWriter."""
+
+    def __init__(self, engine: SimulationEngine, update_time, time_per_update, checkpoint=None,
+                 checkpoint_interval=300):
+        """
+        Creates a new thread to coordinate a simulation engine on
+
+        :param engine: Simulation engine, which is started and stopped by this thread
+        :param update_time: Minimum real time between iterations of the simulation in seconds
+        :param time_per_update: Simulated time per iteration in seconds
+        :param checkpoint: Directory the state of the engine is saved to, or None to not save it
+        :param checkpoint_interval: Minimum real time between saves in seconds
+        """
+        super(SimulationThread, self).__init__(daemon=True)
+        self._engine = engine
+        self._update_time = update_time
+        self._time_per_update = time_per_update
+        self._checkpoint = checkpoint
+        self._checkpoint_interval = checkpoint_interval
+        self._last_checkpoint = time.time()
+        self._writer = DatabaseWriter()
+        # Held while the engine is progressing, so that checkpoints are taken between iterations
+        self._engine_lock = threading.Lock()
+        self._engine_started = False
+        self._stop_event = threading.Event()
+        self._unpause_event = threading.Event()
+        self._unpause_event.set()
+        self._running = False
+
+    def run(self):
+        """Starts this thread. Will continually run until stop method is called."""
+        keep_time = timedelta(hours=2)
+        self._running = True
+        self._writer.start()
+        try:
+            with self._engine as sim:
+                self._engine_started = True
+                # Writes the flights, and after a restore the reports, that the engine starts with
+                self._writer.push(sim.current_time, sim.current_flights, sim.removed_flights,
+                                  sim.new_reports, sim.current_time - keep_time)
+                while not self.stopped:
+                    self._unpause_event.wait()
+                    if self.stopped:
+                        break
+                    start = time.time()
+                    with self._engine_lock:
+                        sim.progress(timedelta(seconds=self._time_per_update))
+                    self._writer.push(sim.current_time, sim.current_flights, sim.removed_flights,
+                                      sim.new_reports, sim.current_time - keep_time)
+                    metrics = self._writer.metrics
+                    print(str(len(sim.new_reports)) + ' new reports')
+                    print('database writer: {} queued, last commit {:.3f}s, {} errors, '
+                          '{} iterations to retry, {} dropped'.format(
+                              metrics['queue_depth'], metrics['last_commit_time'],
+                              metrics['errors'], metrics['unwritten_ticks'],
+                              metrics['dropped_ticks']))
+                    dif = time.time() - start
+                    if dif < self._update_time:
+                        time.sleep(self._update_time - dif)
+                    else:
+                        print('simulation progressing ' +
+                              str(dif - self._update_time) + 's too slow')
+                    if time.time() - self._last_checkpoint >= self._checkpoint_interval:
+                        self.checkpoint()
+                self.checkpoint()
+                with self._engine_lock:
+                    self._engine_started = False
+        finally:
+            self._writer.close()
+            # The query view reads the database again rather than the last snapshot
+            live_state.clear()
+        self._running = False
+
+    def checkpoint(self):
+        """Saves the state of the engine to the checkpoint directory, if this thread has one and
+        the engine is running."""
+        if self._checkpoint is None:
+            return
+        with self._engine_lock:
+            if not self._engine_started:
+                return
+            self._engine.save_state(self._checkpoint)
+        self._last_checkpoint = time.time()
+        print('simulation saved to ' + self._checkpoint)
+
+    def stop(self):
+        """Stops this thread, and waits until it has saved its final checkpoint and closed its
+        database writer. Cannot be started again once stopped."""
+        print('simulation stopped')
+
+        self._stop_event.set()
+        self._unpause_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+        self._running = False
+
+    @property
+    def metrics(self):
+        """Statistics of the database writer of this thread, as described by DatabaseWriter.metrics."""
+        return self._writer.metrics
+
+    @property
+    def stopped(self):
+        """Whether this thread is stopped."""
+        return self._stop_event.is_set()
+
+    @property
+    def running(self):
+        """Whether this thread is running."""
+        return self._running
+
+    def pause(self):
+        """Pauses this thread. Can be un-paused and continue at a later time.
+        The thread will wait for unpause to be called rather than continually processing."""
+        print('simulation paused')
+        self._unpause_event.clear()
+
+    def unpause(self):
+        "Unpauses this thread. Continues running on the iteration it paused on."
+        print('simulation unpaused')
+        self._unpause_event.set()
+
+    @property
+    def paused(self):
+        """Whether this thread is paused."""
+        return not self._unpause_event.is_set()
@@ -1,22 +1,30 @@
 from datetime import datetime, timedelta
-from random import randint, uniform
+from collections import deque, namedtuple
 from netCDF4 import Dataset
 import numpy as np
 import time
-import pickle
 import copy
-import math
+import heapq
+import json
+import itertools
+import glob
+import os
 from . import definitions
 from .Flight_Statistics.Statistics_Fun import airport_statistics, airport_info
 from .Weather_Data.Weather_Fun import *
+from .Geodesy import EARTH_RADIUS, get_bearing, get_vector_angle, interpolate_vectors, \
+    from_unit_vectors, to_unit_vectors
 
 
 FLIGHT_HEIGHT = 6000
+FLIGHT_SPEED = 245  # m / s
 
 
 class Aircraft:
     """Represents an aircraft type."""
 
+    __slots__ = ('name', 'weight', 'db_id')
+
     def __init__(self, name: str, weight: float):
         """Creates a new aircraft.
 
@@ -28,9 +36,17 @@ class Aircraft:
         self.db_id = None
 
 
+# Aircraft types shared by every flight, with the probability of a flight using each type
+AIRCRAFT_PROBABILITIES = {Aircraft('Cessna 172', 100): .2, Aircraft('Boeing 747', 100): .5,
+                          Aircraft('Airbus A380', 100): .3}
+AIRCRAFT = {aircraft.name: aircraft for aircraft in AIRCRAFT_PROBABILITIES}
+
+
 class Airport:
     """Represents an airport."""
 
+    __slots__ = ('code', 'name', 'lat', 'lon', 'alt', 'db_id')
+
     def __init__(self, code: str, name: str, lat: float, lon: float, alt: float):
         """Creates a new airport
 
@@ -49,13 +65,21 @@ class Airport:
 
 
 class Flight:
-    """Represents a flight."""
+    """Represents a flight.
+
+    While a flight is active, its position is stored in a FlightTable and the flight acts as
+    a view of its row. Once it is removed from the table it keeps its last position.
+    """
+
+    __slots__ = ('origin', 'dest', 'start_time', 'end_time', 'plane', '_lat', '_lon', 'alt',
+                 '_bearing', 'route', 'id', 'db_id', '_table', '_row')
 
     uid = 0
+    uid_step = 1
 
     def __init__(self, origin: Airport, dest: Airport, start_time: datetime,
                  end_time: datetime, plane: Aircraft, lat: float, lon: float,
-                 alt: float, bearing: float):
+                 alt: float, bearing: float, route: int=None):
         """Creates a new flight.
 
         :param plane: Plane type.
@@ -67,29 +91,83 @@ class Flight:
         :param lon: Current flight Longitude
         :param alt: Current flight altitude in meters
         :param bearing: Current flight bearing in degrees
+        :param route: Index of the flight's route in its generator's RouteTable
         """
         self.origin = origin
         self.dest = dest
         self.start_time = start_time
         self.end_time = end_time
         self.plane = plane
-        self.lat = lat
-        self.lon = lon
+        self._lat = lat
+        self._lon = lon
         self.alt = alt
-        self.bearing = bearing
-        self.identifier = str(Flight.uid)
-        Flight.uid += 1
+        self._bearing = bearing
+        self.route = route
+        self.id = Flight.uid
+        Flight.uid += Flight.uid_step
         self.db_id = None
+        self._table = None
+        self._row = -1
+
+    @property
+    def identifier(self):
+        """Identifier of the flight as stored in the database."""
+        return str(self.id)
+
+    @property
+    def lat(self):
+        if self._table is not None:
+            return float(self._table.lat[self._row])
+        return self._lat
+
+    @property
+    def lon(self):
+        if self._table is not None:
+            return float(self._table.lon[self._row])
+        return self._lon
+
+    @property
+    def bearing(self):
+        if self._table is not None:
+            return float(self._table.bearing[self._row])
+        return self._bearing
+
+    def set_position(self, lat: float, lon: float, bearing: float):
+        """Sets the position of a flight which is not stored in a FlightTable.
+
+        :param lat: Flight latitude
+        :param lon: Flight longitude
+        :param bearing: Flight bearing in degrees
+        """
+        self._lat, self._lon, self._bearing = lat, lon, bearing
+
+    def __getstate__(self):
+        # A pickled flight carries its current position rather than its table
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state.update(_lat=self.lat, _lon=self.lon, _bearing=self.bearing, _table=None, _row=-1)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _detach(self):
+        """Copies this flight's position out of its table."""
+        self._lat, self._lon, self._bearing = self.lat, self.lon, self.bearing
+        self._table = None
+        self._row = -1
 
 
 class WeatherReport:
     """Represents a weather report sent by a plane."""
 
-    def __init__(self, time: datetime, flight: Flight, lat: float, lon: float,
+    __slots__ = ('time', 'flight_id', 'lat', 'lon', 'alt', 'wind_x', 'wind_y', 'tke', 'db_id')
+
+    def __init__(self, time: datetime, flight_id: int, lat: float, lon: float,
                  alt: float, wind_x: float, wind_y: float, tke: float):
         """
         :param time: Date and time the weather report was received at.
-        :param flight: Flight that created this weather report
+        :param flight_id: Id of the flight that created this weather report
         :param lat: Longitude the weather report was created at.
         :param lon: Longitude the weather report was created at.
         :param alt: Altitude the weather report was created at.
@@ -98,7 +176,7 @@ class WeatherReport:
         :param tke: Ambient turbulent kinetic energy in J/kg.
         """
         self.time = time
-        self.flight = flight
+        self.flight_id = flight_id
         self.lat = lat
         self.lon = lon
         self.alt = alt
@@ -108,111 +186,430 @@ class WeatherReport:
         self.db_id = None
 
 
-def get_angular_distance(lat1, lon1, lat2, lon2):
-    """
-    Returns the angular great circle distance from the first
-    coordinate to the second coordinate
-    """
-    lat1 = math.radians(lat1)
-    lon1 = math.radians(lon1)
-    lat2 = math.radians(lat2)
-    lon2 = math.radians(lon2)
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat / 2)**2 + math.cos(lat1) * \
-        math.cos(lat2) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return c
-
-
-def get_distance(lat1, lon1, lat2, lon2, alt):
-    """
-    Returns the great circle distance in meters from the first
-    coordinate to the second coordinate at the given altitude
+class RouteTable:
+    """Precomputed great circle routes between every pair of airports with flights between them.
+
+    Routes are sorted by origin, so the routes starting at each airport are consecutive.
     """
-    r = 6371000 + alt  # radius from center of Earth in meters
-    return r * get_angular_distance(lat1, lon1, lat2, lon2)
 
+    def __init__(self, airport_info: dict, conditional_probabilities: dict,
+                 speed: float=FLIGHT_SPEED, altitude: float=FLIGHT_HEIGHT):
+        """Creates a new route table.
 
-def get_inter_point(lat1, lon1, lat2, lon2, x):
-    """
-    Returns the intermediate point between the two given points
-    on the great circle that is x proportion from the first to the second
-    """
-    d = get_angular_distance(lat1, lon1, lat2, lon2)
-    lat1 = math.radians(lat1)
-    lon1 = math.radians(lon1)
-    lat2 = math.radians(lat2)
-    lon2 = math.radians(lon2)
-    a = math.sin((1 - x) * d) / math.sin(d)
-    b = math.sin(x * d) / math.sin(d)
-    x = a * math.cos(lat1) * math.cos(lon1) + b * \
-        math.cos(lat2) * math.cos(lon2)
-    y = a * math.cos(lat1) * math.sin(lon1) + b * \
-        math.cos(lat2) * math.sin(lon2)
-    z = a * math.sin(lat1) + b * math.sin(lat2)
-    lati = math.atan2(z, math.sqrt(x**2 + y**2))
-    loni = math.atan2(y, x)
-    return math.degrees(lati), math.degrees(loni)
-
-
-def get_bearing(lat1, lon1, lat2, lon2):
-    """
-    Returns the great circle bearing in degrees from the first
-    coordinate to the second coordinate
+        :param airport_info: Dictionary from airport codes to latitude, longitude and altitude.
+        :param conditional_probabilities: Dictionary from origin codes to dictionaries from
+                                          destination codes to probabilities of flying there.
+        :param speed: Flight speed in m/s.
+        :param altitude: Flight altitude in meters.
+        """
+        codes = sorted(code for code in conditional_probabilities if code in airport_info)
+        self.airports = [Airport(code, code, *airport_info[code]) for code in codes]
+        self._airport_index = {code: i for i, code in enumerate(codes)}
+        routes = [(self._airport_index[origin], self._airport_index[dest], p)
+                  for origin in codes
+                  for dest, p in sorted(conditional_probabilities[origin].items())
+                  if p > 0 and dest in self._airport_index]
+        self.origin = np.array([route[0] for route in routes], dtype=np.int32)
+        self.dest = np.array([route[1] for route in routes], dtype=np.int32)
+        self.probability = np.array([route[2] for route in routes])
+        self._route_index = {(codes[o], codes[d]): i for i, (o, d, _) in enumerate(routes)}
+
+        coordinates = np.array([airport_info[code] for code in codes])
+        lats, lons = coordinates[:, 0], coordinates[:, 1]
+        self.origin_lat, self.origin_lon = lats[self.origin], lons[self.origin]
+        self.dest_lat, self.dest_lon = lats[self.dest], lons[self.dest]
+        self.origin_vectors = to_unit_vectors(self.origin_lat, self.origin_lon)
+        self.dest_vectors = to_unit_vectors(self.dest_lat, self.dest_lon)
+        self.angle = get_vector_angle(self.origin_vectors, self.dest_vectors)
+        self.distance = (EARTH_RADIUS + altitude) * self.angle
+        self.duration = self.distance / speed
+        self.bearing = get_bearing(self.origin_lat, self.origin_lon, self.dest_lat, self.dest_lon)
+
+    def __len__(self):
+        return len(self.origin)
+
+    def airport(self, code: str) -> Airport:
+        """Returns the shared Airport instance with the given code."""
+        return self.airports[self._airport_index[code]]
+
+    def find(self, origin: str, dest: str) -> int:
+        """Returns the index of the route between the airports with the given codes."""
+        return self._route_index[(origin, dest)]
+
+
+class ReportBatch:
+    """Weather reports stored as NumPy columns. Iterating over a batch creates a WeatherReport for each row."""
+
+    COLUMNS = ('time', 'flight_id', 'lat', 'lon', 'alt', 'wind_x', 'wind_y', 'tke')
+
+    def __init__(self, time, flight_id, lat, lon, alt, wind_x, wind_y, tke):
+        """Creates a new batch of weather reports. Arguments are arrays with one entry per report,
+        in the order of the WeatherReport constructor.
+
+        :param time: Dates and times the reports were received at, as datetime64 values.
+        """
+        self.time = np.asarray(time, dtype='datetime64[us]')
+        self.flight_id = np.asarray(flight_id, dtype=np.int64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.alt = np.asarray(alt, dtype=np.float64)
+        self.wind_x = np.asarray(wind_x, dtype=np.float64)
+        self.wind_y = np.asarray(wind_y, dtype=np.float64)
+        self.tke = np.asarray(tke, dtype=np.float64)
+
+    @classmethod
+    def empty(cls):
+        return cls(*([[]] * len(cls.COLUMNS)))
+
+    @classmethod
+    def concatenate(cls, batches):
+        """Joins the given batches into one, in order."""
+        batches = [batch for batch in batches if batch is not None]
+        if not batches:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(batch, column) for batch in batches])
+                     for column in cls.COLUMNS))
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, index):
+        """Selects reports by a slice, boolean mask or array of indices.
+
+        :return: ReportBatch of the selected reports.
+        """
+        return ReportBatch(*(getattr(self, column)[index] for column in self.COLUMNS))
+
+    def __iter__(self):
+        columns = [getattr(self, column).tolist() for column in self.COLUMNS]
+        for row in zip(*columns):
+            yield WeatherReport(*row)
+
+
+DepartureBatch = namedtuple('DepartureBatch', ['flights', 'routes', 'time', 'start', 'end'])
+DepartureBatch.__doc__ = """Flights generated for a time window, with their route indices and their start and
+end times as arrays of seconds after the given time."""
+
+
+def arrival_offsets(window: float, shape: float, rng=np.random):
+    """Draws arrival times with gamma distributed gaps, in seconds after the start of a time
+    window, until one falls after the end of the window.
+
+    :param window: Length of the time window in seconds.
+    :param shape: Shape of the gamma distribution, which is also the expected gap in seconds.
+    :param rng: Random number generator to draw with.
+    :return: Array of increasing arrival times. Only the last one is after the window.
     """
-    lat1 = math.radians(lat1)
-    lon1 = math.radians(lon1)
-    lat2 = math.radians(lat2)
-    lon2 = math.radians(lon2)
-    y = math.sin(lon2 - lon1) * math.cos(lat2)
-    x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * \
-        math.cos(lat2) * math.cos(lon2 - lon1)
-    return math.degrees(math.atan2(y, x))
+    chunk = int(window / max(shape, 1)) + 16
+    offsets = []
+    total = 0.0
+    while True:
+        times = total + np.cumsum(rng.gamma(shape, size=chunk))
+        after = int(np.searchsorted(times, window, side='right'))
+        if after < chunk:
+            offsets.append(times[:after + 1])
+            return np.concatenate(offsets)
+        offsets.append(times)
+        total = times[-1]
+
+
+class AliasSampler:
+    """Draws random samples from a categorical distribution in constant time per sample,
+    using Walker's alias method with Vose's construction."""
+
+    def __init__(self, weights):
+        """Creates a new sampler. Weights do not need to be normalized.
+
+        :param weights: Array of non-negative weights of each index.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if np.any(weights < 0):
+            raise ValueError('All probability values must be non-negative.')
+        if not np.sum(weights) > 0:
+            raise ValueError('At least one probability value must be positive.')
+        n = len(weights)
+        scaled = weights * n / np.sum(weights)
+        self._prob = np.ones(n)
+        self._alias = np.arange(n)
+        small = [i for i in range(n) if scaled[i] < 1]
+        large = [i for i in range(n) if scaled[i] >= 1]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] += scaled[s] - 1
+            (small if scaled[l] < 1 else large).append(l)
+
+    def __len__(self):
+        return len(self._prob)
+
+    def sample(self, size=None, rng=np.random):
+        """Draws random indices.
+
+        :param size: Number of indices to draw, or None to draw a single index.
+        :param rng: Random number generator to draw with.
+        :return: The drawn index, or an array of drawn indices.
+        """
+        u = np.asarray(rng.random(size)) * len(self._prob)
+        i = np.minimum(u.astype(np.intp), len(self._prob) - 1)
+        indices = np.where(u - i < self._prob[i], i, self._alias[i])
+        return int(indices) if size is None else indices
 
 
 class FlightGenerator:
     """Generates flights randomly starting at a given time with a given  expected frequency."""
 
-    def __init__(self, average_time: timedelta):
+    def __init__(self, average_time: timedelta, flight_speed: float=FLIGHT_SPEED, rng=None):
         """
         Creates a new flight generator.
 
         :param average_time: Expected time between flights in seconds.
+        :param flight_speed: Flight speed in m/s.
+        :param rng: NumPy Generator to draw flights with, or None to use a freshly seeded one.
         """
         self._average_time = average_time
         self._airports, self._origin_probabilities, self._conditional_probabilities = airport_statistics()
-        self._plane_probabilities = {Aircraft('Cessna 172', 100): .2, Aircraft('Boeing 747', 100): .5,
-                                     Aircraft('Airbus A380', 100): .3}
         self._airport_info = airport_info()
-
-    def next_flight(self, current_time: datetime):
-        """Generates and returns a new flight randomly
-
-        :return: The next generated flight
-        """
-        flight_speed = 245  # m / s
-        dt = np.random.gamma(self._average_time.seconds)
-        flight_start = current_time + timedelta(seconds=dt)
-        origin = weighted_random(self._origin_probabilities)
-        dest = weighted_random(self._conditional_probabilities[origin])
-        plane_type = weighted_random(self._plane_probabilities)
-        start_lat, start_lon, start_alt = self._airport_info[origin]
-        end_lat, end_lon, end_alt = self._airport_info[dest]
-        flight_time = get_distance(
-            start_lat, start_lon, end_lat, end_lon, FLIGHT_HEIGHT) / flight_speed
-        bearing = get_bearing(start_lat, start_lon, end_lat, end_lon)
-        return Flight(Airport(origin, origin, start_lat, start_lon, start_alt),
-                      Airport(dest, dest, end_lat, end_lon, end_alt),
+        self._routes = RouteTable(self._airport_info, self._conditional_probabilities,
+                                  flight_speed, FLIGHT_HEIGHT)
+        self._route_sampler = AliasSampler(
+            [self._origin_probabilities[self._routes.airports[origin].code] * p
+             for origin, p in zip(self._routes.origin, self._routes.probability)])
+        self._planes = list(AIRCRAFT_PROBABILITIES)
+        self._plane_sampler = AliasSampler(list(AIRCRAFT_PROBABILITIES.values()))
+        self._rng = rng if rng is not None else np.random.default_rng()
+
+    def next_flights(self, current_time: datetime, stop_time: datetime):
+        """Generates every flight departing after the current time up to and including the stop
+        time, and the first flight departing after the stop time. Flights which also land by
+        the stop time are skipped.
+
+        :param current_time: Time that the first departure is drawn from.
+        :param stop_time: End of the time window.
+        :return: Tuple containing a DepartureBatch of the flights departing in the window and
+                 landing after it, and the first flight departing after the stop time.
+        """
+        window = (stop_time - current_time).total_seconds()
+        offsets = arrival_offsets(window, self._average_time.total_seconds(), self._rng)
+        routes = self._route_sampler.sample(len(offsets), self._rng)
+        planes = self._plane_sampler.sample(len(offsets), self._rng)
+        ends = offsets + self._routes.duration[routes]
+        keep = np.flatnonzero(ends[:-1] > window)
+        flights = [self._make_flight(current_time, routes[k], planes[k], offsets[k]) for k in keep]
+        leftover = self._make_flight(current_time, routes[-1], planes[-1], offsets[-1])
+        return DepartureBatch(flights, routes[keep], current_time, offsets[keep], ends[keep]), leftover
+
+    def _make_flight(self, current_time: datetime, route: int, plane: int, offset: float):
+        flight_start = current_time + timedelta(seconds=float(offset))
+        return Flight(self._routes.airports[self._routes.origin[route]],
+                      self._routes.airports[self._routes.dest[route]],
                       flight_start,
-                      flight_start + timedelta(seconds=flight_time),
-                      plane_type, 0, 0, FLIGHT_HEIGHT, bearing)
+                      flight_start + timedelta(seconds=float(self._routes.duration[route])),
+                      self._planes[plane], 0, 0, FLIGHT_HEIGHT,
+                      float(self._routes.bearing[route]), int(route))
+
+    def restore_flight(self, flight_id: int, origin: str, dest: str, plane: str,
+                       start_time: datetime, end_time: datetime, alt: float) -> Flight:
+        """Recreates a flight generated by this generator from its saved attributes.
+
+        :param flight_id: Id of the flight.
+        :param origin: Code of the origin airport.
+        :param dest: Code of the destination airport.
+        :param plane: Name of the aircraft type.
+        :param start_time: Time the flight takes off.
+        :param end_time: Time the flight lands.
+        :param alt: Flight altitude in meters.
+        :return: The recreated flight, which is not stored in any FlightTable.
+        """
+        route = self._routes.find(origin, dest)
+        flight = Flight(self._routes.airports[self._routes.origin[route]],
+                        self._routes.airports[self._routes.dest[route]],
+                        start_time, end_time, AIRCRAFT[plane], 0, 0, alt,
+                        float(self._routes.bearing[route]), route)
+        flight.id = flight_id
+        return flight
+
+    @property
+    def rng(self):
+        return self._rng
+
+    @property
+    def routes(self):
+        return self._routes
 
     @property
     def flight_time(self):
         return self._average_time
 
 
+class FlightTable:
+    """Stores active flights as NumPy columns so that all of their positions can be updated at once."""
+
+    def __init__(self, epoch: datetime, routes: RouteTable=None, capacity: int=1024):
+        """Creates a new empty flight table.
+
+        :param epoch: Reference time that start and end times are stored relative to.
+        :param routes: Route table that the routes of added flights are copied from.
+        :param capacity: Initial number of rows to allocate.
+        """
+        self._epoch = epoch
+        self._routes = routes
+        self._size = 0
+        self._origin = np.empty((capacity, 3))
+        self._dest = np.empty((capacity, 3))
+        self._dest_lat = np.empty(capacity)
+        self._dest_lon = np.empty(capacity)
+        self._angle = np.empty(capacity)
+        self._start = np.empty(capacity)
+        self._end = np.empty(capacity)
+        self._lat = np.zeros(capacity)
+        self._lon = np.zeros(capacity)
+        self._bearing = np.zeros(capacity)
+        self._alt = np.zeros(capacity)
+        self._id = np.zeros(capacity, dtype=np.int64)
+        self._flights = np.empty(capacity, dtype=object)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, flight: Flight):
+        """Adds a flight to the table, making the flight a view of its new row.
+
+        :param flight: Flight to add.
+        """
+        if self._size == len(self._flights):
+            self._grow(2 * len(self._flights))
+        row = self._size
+        if flight.route is not None and self._routes is not None:
+            route = flight.route
+            self._origin[row] = self._routes.origin_vectors[route]
+            self._dest[row] = self._routes.dest_vectors[route]
+            self._angle[row] = self._routes.angle[route]
+        else:
+            self._origin[row] = to_unit_vectors(flight.origin.lat, flight.origin.lon)
+            self._dest[row] = to_unit_vectors(flight.dest.lat, flight.dest.lon)
+            self._angle[row] = get_vector_angle(self._origin[row], self._dest[row])
+        self._dest_lat[row] = flight.dest.lat
+        self._dest_lon[row] = flight.dest.lon
+        self._start[row] = (flight.start_time - self._epoch).total_seconds()
+        self._end[row] = (flight.end_time - self._epoch).total_seconds()
+        self._lat[row] = flight.lat
+        self._lon[row] = flight.lon
+        self._bearing[row] = flight.bearing
+        self._alt[row] = flight.alt
+        self._id[row] = flight.id
+        self._flights[row] = flight
+        flight._table = self
+        flight._row = row
+        self._size += 1
+
+    def add_batch(self, batch: DepartureBatch):
+        """Adds a batch of generated flights to the table, copying their routes from the route table.
+
+        :param batch: Flights to add.
+        """
+        n = len(batch.flights)
+        if n == 0:
+            return
+        capacity = len(self._flights)
+        while self._size + n > capacity:
+            capacity *= 2
+        if capacity > len(self._flights):
+            self._grow(capacity)
+        rows = slice(self._size, self._size + n)
+        routes = batch.routes
+        self._origin[rows] = self._routes.origin_vectors[routes]
+        self._dest[rows] = self._routes.dest_vectors[routes]
+        self._dest_lat[rows] = self._routes.dest_lat[routes]
+        self._dest_lon[rows] = self._routes.dest_lon[routes]
+        self._angle[rows] = self._routes.angle[routes]
+        shift = (batch.time - self._epoch).total_seconds()
+        self._start[rows] = batch.start + shift
+        self._end[rows] = batch.end + shift
+        self._lat[rows] = 0
+        self._lon[rows] = 0
+        self._bearing[rows] = 0
+        self._alt[rows] = [flight.alt for flight in batch.flights]
+        self._id[rows] = [flight.id for flight in batch.flights]
+        self._flights[rows] = batch.flights
+        for row, flight in enumerate(batch.flights, self._size):
+            flight._table = self
+            flight._row = row
+        self._size += n
+
+    def remove(self, rows):
+        """Removes the flights in the given rows. Removed flights keep their last position, and
+        the last rows of the table are moved into the freed rows.
+
+        :param rows: Array of row indices to remove.
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.intp))
+        if len(rows) == 0:
+            return
+        for flight in self._flights[rows]:
+            flight._detach()
+        new_size = self._size - len(rows)
+        holes = rows[rows < new_size]
+        tail = np.setdiff1d(np.arange(new_size, self._size), rows)
+        for column in (self._origin, self._dest, self._dest_lat, self._dest_lon, self._angle,
+                       self._start, self._end, self._lat, self._lon, self._bearing, self._alt,
+                       self._id, self._flights):
+            column[holes] = column[tail]
+        for row, flight in zip(holes, self._flights[holes]):
+            flight._row = row
+        self._flights[new_size:self._size] = None
+        self._size = new_size
+
+    def update(self, time: datetime):
+        """Moves every flight to its position at the given time along the great circle from its
+        origin to its destination, and points it towards its destination.
+
+        :param time: Current time.
+        """
+        n = self._size
+        now = (time - self._epoch).total_seconds()
+        progress = np.clip((now - self._start[:n]) / (self._end[:n] - self._start[:n]), 0, 1)
+        points = interpolate_vectors(self._origin[:n], self._dest[:n], self._angle[:n], progress)
+        self._lat[:n], self._lon[:n] = from_unit_vectors(points)
+        self._bearing[:n] = get_bearing(self._lat[:n], self._lon[:n],
+                                        self._dest_lat[:n], self._dest_lon[:n])
+
+    def _grow(self, capacity: int):
+        for name in ('_origin', '_dest', '_dest_lat', '_dest_lon', '_angle', '_start', '_end',
+                     '_lat', '_lon', '_bearing', '_alt', '_id', '_flights'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    @property
+    def flights(self):
+        """Array of the flights in the table, in row order."""
+        return self._flights[:self._size]
+
+    @property
+    def ids(self):
+        """Array of the ids of the flights in the table, in row order."""
+        return self._id[:self._size]
+
+    @property
+    def lat(self):
+        return self._lat
+
+    @property
+    def lon(self):
+        return self._lon
+
+    @property
+    def bearing(self):
+        return self._bearing
+
+    @property
+    def alt(self):
+        return self._alt
+
+
 class FlightSimulator:
     """Stores active flights created by a flight generator, and keeps track of active flights."""
 
@@ -223,7 +620,9 @@ class FlightSimulator:
         :param flight_generator: Flight generator.
         """
         self._current_time = current_time
-        self._active_flights = []
+        self._table = FlightTable(current_time, flight_generator.routes)
+        self._landings = []
+        self._landing_order = itertools.count()
         self._new_flights = []
         self._removed_flights = []
         self._flight_generator = flight_generator
@@ -239,65 +638,70 @@ class FlightSimulator:
         self._new_flights = []
         self._removed_flights = []
 
-        if self._leftover_flight is not None and self._leftover_flight.start_time <= stop_time:
-            self._new_flights.append(self._leftover_flight)
-            self._leftover_flight = None
-
         progressed_time = self._current_time
-
-        while progressed_time < stop_time:
-            new_flight = self._flight_generator.next_flight(progressed_time)
-            if new_flight is None:
-                break
-            progressed_time = new_flight.start_time
-            if new_flight.start_time <= stop_time:
-                if new_flight.end_time > stop_time:
-                    self._new_flights.append(new_flight)
+        if self._leftover_flight is not None and self._leftover_flight.start_time <= stop_time:
+            if self._leftover_flight.end_time > stop_time:
+                self._add_flights([self._leftover_flight])
             else:
-                self._leftover_flight = new_flight
+                self._removed_flights.append(self._leftover_flight)
+            progressed_time = self._leftover_flight.start_time
+            self._leftover_flight = None
 
-        all_flights = []
+        if self._leftover_flight is None and stop_time > progressed_time:
+            departures, self._leftover_flight = self._flight_generator.next_flights(
+                progressed_time, stop_time)
+            self._add_flights(departures.flights, departures)
+
+        landed = []
+        while self._landings and self._landings[0][0] <= stop_time:
+            landed.append(heapq.heappop(self._landings)[2])
+        self._table.remove([flight._row for flight in landed])
+        self._removed_flights.extend(landed)
+        self._table.update(stop_time)
+        self._current_time = stop_time
 
-        for flight in self._new_flights + self._active_flights:
-            if flight.end_time > stop_time:
-                all_flights.append(flight)
-                self.get_location(flight)
-            else:
-                self._removed_flights.append(flight)
+    def _add_flights(self, flights, departures: DepartureBatch=None):
+        """Adds flights to the table of active flights and schedules their landings.
 
-        self._active_flights = all_flights
-        self._current_time = stop_time
+        :param flights: Flights to add.
+        :param departures: Batch containing exactly the given flights, if they were generated together.
+        """
+        if departures is None:
+            for flight in flights:
+                self._table.add(flight)
+        else:
+            self._table.add_batch(departures)
+        for flight in flights:
+            heapq.heappush(self._landings, (flight.end_time, next(self._landing_order), flight))
+        self._new_flights.extend(flights)
+
+    def restore(self, current_time: datetime, flights, leftover_flight: Flight=None):
+        """Replaces the state of this simulator, discarding every active flight.
+
+        :param current_time: Time to continue from.
+        :param flights: Flights active at the current time.
+        :param leftover_flight: First flight departing after the current time, if it has
+                                already been generated.
+        """
+        self._current_time = current_time
+        self._table = FlightTable(current_time, self._flight_generator.routes)
+        self._landings = []
+        self._add_flights(flights)
+        self._table.update(current_time)
+        self._new_flights = []
+        self._removed_flights = []
+        self._leftover_flight = leftover_flight
 
     def get_location(self, flight):
-        """Updates and returns the latitude, longitude, and bearing of an active flight.
+        """Returns the latitude, longitude, and bearing of an active flight.
 
         :param flight: Flight to find the position of
         :return: Tuple containing the latitude, longitude and bearing of the
                  given flight if it is active, otherwise None
         """
-        if flight not in self._active_flights:
+        if flight._table is not self._table:
             return None
-        else:
-            lat_start = flight.origin.lat
-            lon_start = flight.origin.lon
-            alt_start = flight.origin.alt
-
-            lat_end = flight.dest.lat
-            lon_end = flight.dest.lon
-            alt_end = flight.dest.alt
-
-            percent_complete = (
-                self.current_time - flight.start_time) / (flight.end_time - flight.start_time)
-
-            cur_lat, cur_lon = get_inter_point(
-                lat_start, lon_start, lat_end, lon_end, percent_complete)
-            cur_bearing = get_bearing(cur_lat, cur_lon, lat_end, lon_end)
-
-            flight.lat = cur_lat
-            flight.lon = cur_lon
-            flight.bearing = cur_bearing
-
-            return cur_lat, cur_lon, cur_bearing
+        return flight.lat, flight.lon, flight.bearing
 
     @property
     def current_flights(self):
@@ -305,12 +709,26 @@ class FlightSimulator:
 
         :return: List of the current active flights.
         """
-        return self._active_flights
+        return list(self._table.flights)
+
+    @property
+    def table(self):
+        """Gets the table storing the currently active flights."""
+        return self._table
 
     @property
     def flight_time(self):
         return self._flight_generator.flight_time
 
+    @property
+    def flight_generator(self):
+        return self._flight_generator
+
+    @property
+    def leftover_flight(self):
+        """First flight departing after the current time, or None if it is not generated yet."""
+        return self._leftover_flight
+
     @property
     def current_time(self):
         return self._current_time
@@ -319,36 +737,61 @@ class FlightSimulator:
 class WeatherReportGenerator:
     """Simulates generation of weather reports using a given flight simulator, weather model, and report frequency."""
 
-    def __init__(self, weather_model: WeatherModel, average_report_time: timedelta):
+    def __init__(self, weather_model: WeatherModel, average_report_time: timedelta, rng=None):
         """Creates a new WeatherReportGenerator.
 
         :param weather_model: Weather model.
         :param average_report_time: Average expected time between reports in seconds.
+        :param rng: NumPy Generator to draw reports with, or None to use a freshly seeded one.
         """
         self._average_report_time = average_report_time
         self._weather = weather_model
         self._airport_info = airport_info()
+        self._rng = rng if rng is not None else np.random.default_rng()
 
-    def next_report(self, current_time: datetime, flights):
-        """Generates and returns a new weather report randomly, and progresses the current time of the generator.
+    def next_reports(self, current_time: datetime, stop_time: datetime, flights: FlightTable):
+        """Generates every weather report received after the current time up to and including the
+        stop time, and draws the time of the first report received after the stop time. That report
+        is not generated until it is received, so that it is sent by a flight active at that time.
 
-        :param current_time: Current time.
+        :param current_time: Time that the first report is drawn from.
+        :param stop_time: End of the time window.
         :param flights: Current active flights.
-        :return: The next generated weather report.
+        :return: Tuple containing a ReportBatch of the reports in the window, and the time of the
+                 first report after the window.
         """
-        dt = np.random.gamma(self._average_report_time.seconds)
-        if len(flights) == 0:
-            return None
-        flight = flights[randint(0, len(flights) - 1)]
-        cur_lat, cur_lon, cur_alt = flight.lat, flight.lon, flight.alt
-        report_time = current_time + timedelta(seconds=dt)
-        weather = self._weather.get_weather(
-            cur_lat, cur_lon, cur_alt, report_time)
-        if weather is None:
-            return None
-        tke, uwnd, vwnd = weather
-        return WeatherReport(report_time, flight, cur_lat, cur_lon, cur_alt,
-                             uwnd, vwnd, tke)
+        window = (stop_time - current_time).total_seconds()
+        offsets = arrival_offsets(window, self._average_report_time.total_seconds(), self._rng)
+        next_time = current_time + timedelta(seconds=float(offsets[-1]))
+        times = np.datetime64(current_time, 'us') + \
+            np.round(offsets[:-1] * 1e6).astype('timedelta64[us]')
+        return self.reports_at(times, flights), next_time
+
+    def reports_at(self, times, flights: FlightTable):
+        """Generates weather reports received at the given times. Reports are sent by randomly
+        selected active flights from their current positions. Reports outside of the weather model
+        are dropped.
+
+        :param times: Array of the times the reports are received at, as datetime64 values.
+        :param flights: Current active flights.
+        :return: ReportBatch of the valid reports.
+        """
+        times = np.asarray(times, dtype='datetime64[us]')
+        if len(flights) == 0 or len(times) == 0:
+            return ReportBatch.empty()
+        rows = self._rng.integers(len(flights), size=len(times))
+        lat, lon, alt = flights.lat[rows], flights.lon[rows], flights.alt[rows]
+        tke, uwnd, vwnd, valid = self._weather.get_weather_batch(lat, lon, alt, times)
+        reports = ReportBatch(times, flights.ids[rows], lat, lon, alt, uwnd, vwnd, tke)
+        return reports[valid]
+
+    @property
+    def rng(self):
+        return self._rng
+
+    @property
+    def weather_model(self):
+        return self._weather
 
     @property
     def report_time(self):
@@ -358,51 +801,161 @@ class WeatherReportGenerator:
 class WeatherReportSimulator:
     """Simulates storage of active weather reports."""
 
+    STATE_VERSION = 4
+    # Kinds of flights stored in a saved state
+    ACTIVE, LEFTOVER, LANDED = range(3)
+
     def __init__(self, flight_simulator: FlightSimulator,
                  report_generator: WeatherReportGenerator,
                  keep_time: timedelta):
         self._flight_simulator = flight_simulator
         self._report_generator = report_generator
         self._keep_time = keep_time
-        self._current_reports = []
-        self._new_reports = []
-        self._removed_reports = []
+        # Batches of retained reports in the order they were generated, which is also time order
+        self._current_reports = deque()
+        self._num_current_reports = 0
+        # Completed flights in the order they were removed, until their reports have expired
+        self._landed_flights = deque()
+        self._new_reports = ReportBatch.empty()
+        self._removed_reports = ReportBatch.empty()
         self._current_time = copy.deepcopy(flight_simulator.current_time)
-        self._leftover_report = None
+        self._next_report_time = None
 
     def progress(self, d_time: timedelta):
         self._flight_simulator.progress(d_time)
         stop_time = self._current_time + d_time
-        self._new_reports = []
-        self._removed_reports = []
-
-        if self._leftover_report is not None and self._leftover_report.time <= stop_time:
-            self._new_reports.append(self._leftover_report)
-            self._leftover_report = None
+        new_reports = []
 
         progressed_time = self._current_time
-        while progressed_time < stop_time:
-            new_report = self._report_generator.next_report(progressed_time,
-                                                            self._flight_simulator.current_flights)
-            if new_report is None:
+        if self._next_report_time is not None and self._next_report_time <= stop_time:
+            new_reports.append(self._report_generator.reports_at(
+                [np.datetime64(self._next_report_time, 'us')], self._flight_simulator.table))
+            progressed_time = self._next_report_time
+            self._next_report_time = None
+
+        if self._next_report_time is None and stop_time > progressed_time:
+            reports, self._next_report_time = self._report_generator.next_reports(
+                progressed_time, stop_time, self._flight_simulator.table)
+            new_reports.append(reports)
+
+        self._new_reports = ReportBatch.concatenate(new_reports)
+        if len(self._new_reports) > 0:
+            self._current_reports.append(self._new_reports)
+            self._num_current_reports += len(self._new_reports)
+
+        cutoff = np.datetime64(stop_time - self._keep_time, 'us')
+        removed_reports = []
+        while self._current_reports:
+            oldest = self._current_reports[0]
+            expired = int(np.searchsorted(oldest.time, cutoff, side='left'))
+            if expired == 0:
                 break
-            progressed_time = new_report.time
-            if new_report is not None:
-                if new_report.time <= stop_time:
-                    self._new_reports.append(new_report)
-                else:
-                    self._leftover_report = new_report
-
-        all_reports = []
-        for r in self._new_reports + self._current_reports:
-            if r.time < stop_time - self._keep_time:
-                self._removed_reports.append(r)
-            else:
-                all_reports.append(r)
-
-        self._current_reports = all_reports
+            removed_reports.append(oldest[:expired])
+            self._num_current_reports -= expired
+            if expired < len(oldest):
+                self._current_reports[0] = oldest[expired:]
+                break
+            self._current_reports.popleft()
+        self._removed_reports = ReportBatch.concatenate(removed_reports)
+
+        # Reports are only sent by flights which are active, so before they land
+        self._landed_flights.extend(self._flight_simulator._removed_flights)
+        while self._landed_flights and \
+                np.datetime64(self._landed_flights[0].end_time, 'us') < cutoff:
+            self._landed_flights.popleft()
         self._current_time = stop_time
 
+    def save_state(self, file):
+        """Saves the complete state of this simulation as a compressed .npz archive, from which
+        a simulator created with the same configuration can continue identically.
+
+        The state contains the current time, the active flights, the flight generated for after
+        the current time, the landed flights which may have sent retained reports, the time of
+        the next report, the retained reports, the states of the random
+        number generators and the next flight id.
+
+        :param file: Path or binary file object to write to.
+        """
+        flight_simulator = self._flight_simulator
+        reports = self.current_reports
+        leftover_flight = flight_simulator.leftover_flight
+
+        flights = flight_simulator.current_flights
+        kinds = [self.ACTIVE] * len(flights)
+        if leftover_flight is not None:
+            flights.append(leftover_flight)
+            kinds.append(self.LEFTOVER)
+        flights.extend(self._landed_flights)
+        kinds.extend([self.LANDED] * len(self._landed_flights))
+
+        state = {
+            'version': self.STATE_VERSION,
+            'current_time': np.datetime64(self._current_time, 'us'),
+            'next_report_time': np.datetime64(self._next_report_time, 'us'),
+            'uid': Flight.uid,
+            'flight_rng': json.dumps(flight_simulator.flight_generator.rng.bit_generator.state),
+            'report_rng': json.dumps(self._report_generator.rng.bit_generator.state),
+            'flight_kind': np.array(kinds, dtype=np.int8),
+            'flight_id': np.array([flight.id for flight in flights], dtype=np.int64),
+            'flight_origin': np.array([flight.origin.code for flight in flights], dtype=str),
+            'flight_dest': np.array([flight.dest.code for flight in flights], dtype=str),
+            'flight_plane': np.array([flight.plane.name for flight in flights], dtype=str),
+            'flight_start': np.array([flight.start_time for flight in flights], dtype='datetime64[us]'),
+            'flight_end': np.array([flight.end_time for flight in flights], dtype='datetime64[us]'),
+            'flight_lat': np.array([flight.lat for flight in flights], dtype=np.float64),
+            'flight_lon': np.array([flight.lon for flight in flights], dtype=np.float64),
+            'flight_alt': np.array([flight.alt for flight in flights], dtype=np.float64),
+            'flight_bearing': np.array([flight.bearing for flight in flights], dtype=np.float64),
+        }
+        for column in ReportBatch.COLUMNS:
+            state['report_' + column] = getattr(reports, column)
+        np.savez_compressed(file, **state)
+
+    def load_state(self, file):
+        """Replaces the state of this simulation with one saved by save_state. The simulator must
+        have been created with the same configuration as the one which saved the state.
+
+        :param file: Path or binary file object to read from.
+        """
+        with np.load(file) as state:
+            if int(state['version']) != self.STATE_VERSION:
+                raise ValueError('Unsupported simulator state version {}'.format(int(state['version'])))
+            generator = self._flight_simulator.flight_generator
+            flights = []
+            for k in range(len(state['flight_id'])):
+                flight = generator.restore_flight(
+                    int(state['flight_id'][k]), str(state['flight_origin'][k]),
+                    str(state['flight_dest'][k]), str(state['flight_plane'][k]),
+                    state['flight_start'][k].item(), state['flight_end'][k].item(),
+                    float(state['flight_alt'][k]))
+                flight.set_position(float(state['flight_lat'][k]), float(state['flight_lon'][k]),
+                                    float(state['flight_bearing'][k]))
+                flights.append(flight)
+            kinds = state['flight_kind']
+
+            current_time = state['current_time'].item()
+            leftover = [flight for flight, kind in zip(flights, kinds) if kind == self.LEFTOVER]
+            self._flight_simulator.restore(
+                current_time, [flight for flight, kind in zip(flights, kinds) if kind == self.ACTIVE],
+                leftover[0] if leftover else None)
+            self._current_time = current_time
+            self._landed_flights = deque(
+                flight for flight, kind in zip(flights, kinds) if kind == self.LANDED)
+            reports = ReportBatch(*(state['report_' + column] for column in ReportBatch.COLUMNS))
+            self._current_reports = deque([reports] if len(reports) > 0 else [])
+            self._num_current_reports = len(reports)
+            self._new_reports = ReportBatch.empty()
+            self._removed_reports = ReportBatch.empty()
+            self._next_report_time = state['next_report_time'].item()
+            generator.rng.bit_generator.state = json.loads(str(state['flight_rng']))
+            self._report_generator.rng.bit_generator.state = json.loads(str(state['report_rng']))
+            Flight.uid = int(state['uid'])
+
+    def close(self):
+        """Stops the background prefetching of the weather model. The simulator must not be
+        progressed afterwards."""
+        self._report_generator.weather_model.close()
+
     @property
     def flight_time(self):
         return self._flight_sim.flight_time
@@ -427,6 +980,22 @@ class WeatherReportSimulator:
         """
         return self._flight_simulator.current_flights
 
+    @property
+    def flight_table(self):
+        """Gets the table storing the currently active flights.
+
+        :return: FlightTable of the current active flights
+        """
+        return self._flight_simulator.table
+
+    @property
+    def new_flights(self):
+        """Gets the flights which have departed in the last iteration.
+
+        :return: List of the new flights.
+        """
+        return self._flight_simulator._new_flights
+
     @property
     def removed_flights(self):
         """Gets the flights which have completed in the last iteration.
@@ -435,11 +1004,32 @@ class WeatherReportSimulator:
         """
         return self._flight_simulator._removed_flights
 
+    @property
+    def current_reports(self):
+        """Gets the reports generated within the keep time.
+
+        :return: ReportBatch of the retained reports, in time order
+        """
+        return ReportBatch.concatenate(self._current_reports)
+
+    @property
+    def landed_flights(self):
+        """Gets the flights which have completed within the keep time, and so may have sent
+        retained reports.
+
+        :return: List of the landed flights, in the order they completed
+        """
+        return list(self._landed_flights)
+
+    @property
+    def num_current_reports(self):
+        return self._num_current_reports
+
     @property
     def new_reports(self):
         """Gets a list of new reports on this iteration.
 
-        :return: List of the reports generated on this progression
+        :return: ReportBatch of the reports generated on this progression
         """
         return self._new_reports
 
@@ -447,51 +1037,80 @@ class WeatherReportSimulator:
     def removed_reports(self):
         """Gets a list of removed reports on this iteration.
 
-        :return: List of the reports removed on this progression
+        :return: ReportBatch of the reports removed on this progression
         """
         return self._removed_reports
 
+    @staticmethod
+    def weather_paths():
+        """Finds the weather data in the Weather_Data directory. Per-variable weather files are
+        preferred, then the converted weather directory, then the netCDF weather file.
+
+        :return: Paths of the tke, uwnd, vwnd and hgt data, as described by open_datasets.
+        """
+        variable_files = [sorted(glob.glob(pattern)) for pattern in definitions.WEATHER_FILE_PATTERNS]
+        if all(variable_files):
+            return variable_files
+        if os.path.isdir(definitions.WEATHER_NATIVE_DIR):
+            return [[definitions.WEATHER_NATIVE_DIR]] * 4
+        return [[definitions.WEATHER_DATA_DIR]] * 4
+
     @classmethod
-    def get_simulator(cls, flight_time: float=20, report_time: float=10, parallel: bool=False):
-        data = Dataset(definitions.WEATHER_DATA_DIR, 'r', parallel=parallel)
-        start_time = datetime(year=1800, month=1, day=1, hour=0, minute=0, second=0) \
-            + timedelta(hours=data['time'][0])
+    def open_weather(cls, paths=None):
+        """Opens the weather data, and loads the GridRaster of its grid from the grid cache.
+
+        :param paths: Paths of the tke, uwnd, vwnd and hgt data, or None to use weather_paths.
+        :return: Tuple containing the tke, uwnd, vwnd and hgt datasets, and a GridRaster of their grid.
+        """
+        datasets = open_datasets(paths if paths is not None else cls.weather_paths())
+        grid_index = GridRaster.load(
+            datasets[0]['lat'], datasets[0]['lon'], definitions.GRID_CACHE_DIR)
+        return datasets, grid_index
+
+    @classmethod
+    def load_grid(cls, paths=None):
+        """Loads the GridRaster of the weather grid from the grid cache, reading only the grid
+        coordinates of the first tke file or directory.
+
+        :param paths: Paths of the tke, uwnd, vwnd and hgt data, or None to use weather_paths.
+        :return: GridRaster of the weather grid.
+        """
+        data = open_dataset((paths if paths is not None else cls.weather_paths())[0][0])
         try:
-            reg1, reg2 = pickle.load(
-                open(definitions.INDEX_REGRESSION_DIR, 'rb'))
-            index_predictor = IndexPredictor(
-                data['lat'], data['lon'], reg1, reg2)
-        except:
-            index_predictor = IndexPredictor(data['lat'], data['lon'])
-            pickle.dump(index_predictor.get_predictors(), open(
-                definitions.INDEX_REGRESSION_DIR, 'wb'))
-        weather_model = WeatherModel(data, data, data, data, index_predictor)
-        flight_generator = FlightGenerator(timedelta(seconds=flight_time))
+            return GridRaster.load(data['lat'], data['lon'], definitions.GRID_CACHE_DIR)
+        finally:
+            data.close()
+
+    @classmethod
+    def get_simulator(cls, flight_time: float=20, report_time: float=10, seed=None,
+                      weather: SharedWeather=None):
+        """Creates a simulator over the weather data in the Weather_Data directory.
+
+        :param flight_time: Expected time between flights in seconds.
+        :param report_time: Expected time between weather reports in seconds.
+        :param seed: Integer or numpy SeedSequence to seed the simulation with, or None to seed
+                     it from fresh entropy.
+        :param weather: Shared weather to open instead of the Weather_Data directory, whose grid
+                        raster is used instead of the grid cache.
+        :return: New WeatherReportSimulator.
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        flight_seed, report_seed = seed.spawn(2)
+        if weather is None:
+            datasets, grid_index = cls.open_weather()
+        else:
+            datasets, grid_index = weather.open_datasets(), weather.grid_index
+        weather_model = WeatherModel(*datasets, grid_index, prefetch=2)
+        start_time = datetime(year=1800, month=1, day=1, hour=0, minute=0, second=0) \
+            + timedelta(hours=float(datasets[0]['time'][0]))
+        flight_generator = FlightGenerator(timedelta(seconds=flight_time),
+                                           rng=np.random.default_rng(flight_seed))
         flight_simulator = FlightSimulator(start_time, flight_generator)
         # flight_simulator.progress(timedelta(hours=3))
         report_generator = WeatherReportGenerator(
-            weather_model, timedelta(seconds=report_time))
+            weather_model, timedelta(seconds=report_time), np.random.default_rng(report_seed))
         simulator = WeatherReportSimulator(
             flight_simulator, report_generator, timedelta(hours=1))
         # simulator.progress(timedelta(hours=1))
         return simulator
-
-
-def weighted_random(distribution: dict):
-    """Randomly selects an element according to the given distribution. Probabilities do not need to be normalized.
-
-    :param distribution: Dictionary from possible objects to probability of selection.
-    :return: An elements of the given dictionary that is selected with the corresponding probability.
-    """
-    if np.any([distribution[x] < 0 for x in distribution]):
-        raise ValueError('All probability values must be non-negative.')
-    r = uniform(0, np.sum([distribution[x] for x in distribution]))
-    tot = 0
-    i = 0
-    for x in distribution:
-        i += 1
-        tot += distribution[x]
-        if tot >= r:
-            return x
-        if i == len(distribution):
-            return x
@@ -1,92 +1,691 @@
-from geopy.distance import vincenty
 from netCDF4 import Dataset
 from datetime import datetime, timedelta
-from sklearn.neighbors import KNeighborsRegressor
-from itertools import product
+from scipy.spatial import cKDTree
 from math import floor, ceil
+import numpy as np
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+from ..Geodesy import EARTH_RADIUS, to_unit_vectors
 
 
-class IndexPredictor:
-    """Predicts the positional indices of the weather file given the latitude and longitude.
+class GridIndex:
+    """Locates the positional indices of the weather file nearest to given latitudes and longitudes.
+
+    Grid points are stored in a KD-tree over their coordinates on the unit sphere, where the
+    straight line (chord) distance between two points grows monotonically with their great
+    circle distance, so a single tree query finds the nearest grid point.
     """
 
-    def __init__(self, lats, longs, index_1_reg=None, index_2_reg=None):
-        """Creates a new IndexPredictor using the given latitude and longitude 2D arrays.
+    def __init__(self, lats, longs, cutoff: float=70):
+        """Creates a new GridIndex using the given latitude and longitude 2D arrays.
 
         :param lats: Array from indices to latitudes
         :param longs: Array from indices to longitudes
+        :param cutoff: Maximum distance in km from a point to its nearest grid point
         """
-        self._v = vincenty()
-        self._lat = lats
-        self._lon = longs
+        lats = np.asarray(lats[:], dtype=np.float64)
+        longs = np.asarray(longs[:], dtype=np.float64)
+        self._shape = lats.shape
+        self._cutoff = cutoff
+        self._max_chord = 2 * np.sin(1000 * cutoff / (2 * EARTH_RADIUS))
+        self._tree = cKDTree(to_unit_vectors(lats.ravel(), longs.ravel()))
 
-        x = None
-        if index_1_reg is not None:
-            self.index_1_reg = index_1_reg
-        else:
-            x = [(lats[i, j], longs[i, j])
-                 for i, j in product(range(lats.shape[0]), range(lats.shape[1]))]
-            index_1_y = [i for i, j in product(
-                range(lats.shape[0]), range(lats.shape[1]))]
-            self.index_1_reg = KNeighborsRegressor(
-                n_neighbors=1, metric=self._v.measure)
-            self.index_1_reg.fit(x, index_1_y)
-        if index_2_reg is not None:
-            self.index_2_reg = index_2_reg
-        else:
-            if x is None:
-                x = [(lats[i, j], longs[i, j]) for i, j in product(
-                    range(lats.shape[0]), range(lats.shape[1]))]
-            index_2_y = [j for i, j in product(
-                range(lats.shape[0]), range(lats.shape[1]))]
-            self.index_2_reg = KNeighborsRegressor(
-                n_neighbors=1, metric=self._v.measure)
-            self.index_2_reg.fit(x, index_2_y)
-
-    def predict(self, x, n: int=5):
+    def locate(self, lats, lons):
+        """Finds the indices of the grid points nearest to the given latitudes and longitudes.
+
+        :param lats: Latitude or array of latitudes
+        :param lons: Longitude or array of longitudes
+        :return: Tuple of arrays (i, j, valid) with the same shape as the inputs, where valid is
+                 False for points further than the cutoff from every grid point
+        """
+        points = to_unit_vectors(lats, lons)
+        shape = points.shape[:-1]
+        dist, k = self._tree.query(points.reshape(-1, 3),
+                                   distance_upper_bound=self._max_chord)
+        valid = np.isfinite(dist)
+        k = np.where(valid, k, 0)
+        i, j = np.unravel_index(k, self._shape)
+        return i.reshape(shape), j.reshape(shape), valid.reshape(shape)
+
+    def predict(self, x):
         """Predicts the indices of the given latitudes and longitudes.
 
         :param x: Array of latitude, longitude pairs.
-        :param n: Local search range. Increasing it will increase accuracy but will take longer.
-        :return:
-        """
-        return [self._search_neighborhood(int(i), int(j), n, loc[0], loc[1])
-                for i, j, loc in zip(self.index_1_reg.predict(x), self.index_2_reg.predict(x), x)]
-
-    def _valid_index(self, i: int, j: int):
-        return 0 <= i < self._lat.shape[0] and 0 <= j < self._lat.shape[1]
-
-    def _search_neighborhood(self, i: int, j: int, n: int, lat: float, lon: float):
-        cutoff = 70
-        best = (i, j)
-        best_dist = self._v.measure(
-            (self._lat[i, j], self._lon[i, j]), (lat, lon))
-        for di in range(-n, n + 1):
-            for dj in range(-n, n + 1):
-                i_new = i + di
-                j_new = j + dj
-                if self._valid_index(i_new, j_new):
-                    dist = self._v.measure(
-                        (self._lat[i_new, j_new], self._lon[i_new, j_new]), (lat, lon))
-                    if dist < best_dist:
-                        best = (i_new, j_new)
-                        best_dist = dist
-        if best_dist > cutoff:
-            return None
-        return best
+        :return: List containing an (i, j) tuple for each pair, or None if it is outside the grid
+        """
+        x = np.asarray(x, dtype=np.float64).reshape(-1, 2)
+        i, j, valid = self.locate(x[:, 0], x[:, 1])
+        return [(int(a), int(b)) if v else None for a, b, v in zip(i, j, valid)]
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def cutoff(self):
+        return self._cutoff
+
+
+class GridRaster:
+    """Looks up the positional indices of the weather file from a precomputed raster.
+
+    The (lat, lon) -> (i, j) mapping of a GridIndex is sampled at the centres of a regular
+    latitude/longitude raster, so a lookup is a single array indexing operation. Results
+    are exact up to half a raster cell.
+    """
+
+    VERSION = 1
+
+    def __init__(self, table, shape, lat_min: float, resolution: float):
+        """Creates a new GridRaster from a precomputed table.
+
+        :param table: 2D array from raster cells to flattened grid indices, or -1 outside the grid
+        :param shape: Shape of the weather file grid
+        :param lat_min: Latitude of the southern edge of the raster
+        :param resolution: Size of a raster cell in degrees
+        """
+        self._table = table
+        self._shape = tuple(shape)
+        self._lat_min = lat_min
+        self._resolution = resolution
+
+    @classmethod
+    def build(cls, lats, longs, resolution: float=0.1, cutoff: float=70):
+        """Rasterizes the grid with the given latitude and longitude 2D arrays.
+
+        :param lats: Array from indices to latitudes
+        :param longs: Array from indices to longitudes
+        :param resolution: Size of a raster cell in degrees
+        :param cutoff: Maximum distance in km from a point to its nearest grid point
+        :return: The new GridRaster
+        """
+        grid_index = GridIndex(lats, longs, cutoff)
+        lats = np.asarray(lats[:], dtype=np.float64)
+        lat_min, n_lat, n_lon = cls._extent(lats, resolution, cutoff)
+        table = np.empty((n_lat, n_lon), dtype=np.int32)
+        cell_lons = -180 + resolution * (np.arange(n_lon) + 0.5)
+        for row in range(n_lat):
+            cell_lat = lat_min + resolution * (row + 0.5)
+            i, j, valid = grid_index.locate(np.full(n_lon, cell_lat), cell_lons)
+            table[row] = np.where(valid, np.ravel_multi_index((i, j), lats.shape), -1)
+        return cls(table, lats.shape, lat_min, resolution)
+
+    @classmethod
+    def load(cls, lats, longs, cache_dir: str, resolution: float=0.1, cutoff: float=70):
+        """Loads the raster for the given grid from the cache directory, building and saving it
+        first if it is not cached yet. Cached rasters are keyed by a hash of the grid, so a
+        changed weather file never reuses a stale raster.
+
+        :param lats: Array from indices to latitudes
+        :param longs: Array from indices to longitudes
+        :param cache_dir: Directory containing cached rasters
+        :param resolution: Size of a raster cell in degrees
+        :param cutoff: Maximum distance in km from a point to its nearest grid point
+        :return: The GridRaster, with its table memory-mapped from the cache file
+        """
+        lats = np.asarray(lats[:], dtype=np.float64)
+        longs = np.asarray(longs[:], dtype=np.float64)
+        key = hashlib.sha1()
+        key.update(repr((cls.VERSION, lats.shape, resolution, cutoff)).encode())
+        key.update(lats.tobytes())
+        key.update(longs.tobytes())
+        path = os.path.join(cache_dir, 'grid_{}.npy'.format(key.hexdigest()))
+        if not os.path.exists(path):
+            raster = cls.build(lats, longs, resolution, cutoff)
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+            with open(tmp_path, 'wb') as file:
+                np.save(file, raster._table)
+            os.replace(tmp_path, path)
+        lat_min, n_lat, n_lon = cls._extent(lats, resolution, cutoff)
+        table = np.load(path, mmap_mode='r')
+        if table.shape != (n_lat, n_lon):
+            raise ValueError('Cached grid raster {} has an unexpected shape.'.format(path))
+        return cls(table, lats.shape, lat_min, resolution)
+
+    @staticmethod
+    def _extent(lats, resolution, cutoff):
+        """Returns the southern edge and the number of rows and columns of the raster covering
+        the given grid latitudes, padded by the cutoff distance."""
+        pad = np.degrees(1000 * cutoff / EARTH_RADIUS)
+        lat_min = max(-90.0, floor((np.min(lats) - pad) / resolution) * resolution)
+        lat_max = min(90.0, ceil((np.max(lats) + pad) / resolution) * resolution)
+        return lat_min, int(round((lat_max - lat_min) / resolution)), int(round(360 / resolution))
+
+    def locate(self, lats, lons):
+        """Finds the indices of the grid points nearest to the given latitudes and longitudes.
+
+        :param lats: Latitude or array of latitudes
+        :param lons: Longitude or array of longitudes
+        :return: Tuple of arrays (i, j, valid) with the same shape as the inputs, where valid is
+                 False for points further than the cutoff from every grid point
+        """
+        n_lat, n_lon = self._table.shape
+        rows = np.floor((np.asarray(lats, dtype=np.float64) - self._lat_min) / self._resolution)
+        cols = np.floor((np.asarray(lons, dtype=np.float64) + 180) / self._resolution)
+        inside = (rows >= 0) & (rows < n_lat)
+        rows = np.where(inside, rows, 0).astype(np.intp)
+        cols = cols.astype(np.intp) % n_lon
+        k = np.where(inside, self._table[rows, cols], -1)
+        valid = k >= 0
+        i, j = np.unravel_index(np.where(valid, k, 0), self._shape)
+        return i, j, valid
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def table(self):
+        return self._table
+
+    @property
+    def lat_min(self):
+        return self._lat_min
+
+    @property
+    def resolution(self):
+        return self._resolution
+
+
+class SlabCache:
+    """Keeps whole time slabs of weather variables in memory.
+
+    A slab holds every level and grid point of one variable at one time index. Slabs are
+    evicted in least recently used order once their total size exceeds the memory budget.
+    """
+
+    def __init__(self, datasets: dict, max_bytes: int=2 ** 30):
+        """Creates a new SlabCache.
+
+        :param datasets: Dictionary from variable names to the datasets containing them.
+        :param max_bytes: Memory budget in bytes. The most recently used slab is always kept.
+        """
+        self._datasets = datasets
+        self._max_bytes = max_bytes
+        self._slabs = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._read_lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, name: str, t: int, load=None):
+        """Returns the slab of a variable at a time index, reading it from its dataset if it is not cached.
+
+        Reads are serialized, since netCDF datasets cannot be read from several threads at once.
+
+        :param name: Variable name.
+        :param t: Time index.
+        :param load: Optional function from a time index to the value to cache under the given
+                     name, for data derived from the slabs. It must have an nbytes attribute.
+        :return: Read-only array of shape (level, y, x), or the value returned by load.
+        """
+        key = (name, int(t))
+        slab = self._lookup(key)
+        if slab is not None:
+            return slab
+        with self._read_lock:
+            slab = self._lookup(key)
+            if slab is not None:
+                return slab
+            if load is None:
+                slab = np.ma.filled(self._datasets[name][name][int(t)], np.nan)
+                slab.flags.writeable = False
+            else:
+                slab = load(int(t))
+            with self._lock:
+                self._misses += 1
+                self._slabs[key] = slab
+                self._bytes += slab.nbytes
+                while self._bytes > self._max_bytes and len(self._slabs) > 1:
+                    _, evicted = self._slabs.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+            return slab
+
+    def _lookup(self, key):
+        with self._lock:
+            slab = self._slabs.get(key)
+            if slab is not None:
+                self._slabs.move_to_end(key)
+                self._hits += 1
+            return slab
+
+    def evict_before(self, t: int):
+        """Removes all cached slabs with a time index lower than the given one."""
+        with self._lock:
+            for key in [key for key in self._slabs if key[1] < t]:
+                self._bytes -= self._slabs.pop(key).nbytes
+
+    def clear(self):
+        """Removes all cached slabs."""
+        with self._lock:
+            self._slabs.clear()
+            self._bytes = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def size(self):
+        """Total size of the cached slabs in bytes."""
+        return self._bytes
+
+    @property
+    def hit_rate(self):
+        """Fraction of slab reads served from memory."""
+        total = self._hits + self._misses
+        return self._hits / total if total > 0 else 0.0
+
+
+class NpyDataset:
+    """Read-only weather dataset stored as a directory of little-endian .npy arrays.
+
+    Each variable is a separate memory-mapped array, so reads skip decompression and the
+    operating system's page cache shares the data between every process using it. The
+    dataset is indexed by variable name in the same way as a netCDF4 Dataset.
+    """
+
+    VERSION = 1
+    VARIABLES = ('time', 'level', 'lat', 'lon', 'tke', 'uwnd', 'vwnd', 'hgt')
+
+    def __init__(self, path: str):
+        """Opens the dataset in the given directory.
+
+        :param path: Directory created by NpyDataset.convert.
+        """
+        self._path = path
+        with open(os.path.join(path, 'metadata.json'), 'r') as file:
+            self._metadata = json.load(file)
+        if self._metadata['version'] != NpyDataset.VERSION:
+            raise ValueError('Unsupported weather data version {} in {}.'.format(
+                self._metadata['version'], path))
+        self._variables = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                           for name in self._metadata['variables']}
+
+    @classmethod
+    def convert(cls, source: Dataset, path: str, variables=VARIABLES):
+        """Writes the given variables of a netCDF dataset to a new directory. Large variables are
+        copied one time slab at a time so they never have to fit in memory.
+
+        :param source: Dataset to convert.
+        :param path: Directory to create. It is replaced if it already exists.
+        :param variables: Names of the variables to convert.
+        """
+        tmp_path = '{}.{}.tmp'.format(path.rstrip(os.sep), os.getpid())
+        os.makedirs(tmp_path)
+        metadata = {'version': cls.VERSION, 'variables': {}}
+        for name in variables:
+            variable = source[name]
+            first = np.ma.filled(variable[0], np.nan)
+            dtype = first.dtype.newbyteorder('<')
+            array = np.lib.format.open_memmap(os.path.join(tmp_path, name + '.npy'), mode='w+',
+                                              dtype=dtype, shape=variable.shape)
+            if len(variable.dimensions) > 0 and variable.dimensions[0] == 'time' and array.ndim > 1:
+                array[0] = first
+                for t in range(1, variable.shape[0]):
+                    array[t] = np.ma.filled(variable[t], np.nan)
+            else:
+                array[...] = np.ma.filled(variable[:], np.nan)
+            array.flush()
+            del array
+            metadata['variables'][name] = {
+                'dimensions': list(variable.dimensions),
+                'units': getattr(variable, 'units', None)}
+        with open(os.path.join(tmp_path, 'metadata.json'), 'w') as file:
+            json.dump(metadata, file, indent=2)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    def __getitem__(self, name: str):
+        return self._variables[name]
+
+    def __contains__(self, name: str):
+        return name in self._variables
+
+    def close(self):
+        """Releases the memory maps of this dataset. Arrays already read from it stay valid."""
+        self._variables = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def metadata(self):
+        return self._metadata
+
+
+class LevelTable:
+    """Geopotential height columns of one time slab, arranged for vectorized level searches.
+
+    The column of every grid point is stored contiguously and shifted by a per-column offset
+    larger than any column's height range, so all columns together form one sorted array and
+    the levels surrounding any number of heights are found with a single np.searchsorted call.
+    Columns with missing heights, or whose heights do not strictly increase with the level
+    index, cannot be searched and are treated as outside of the weather data.
+    """
+
+    def __init__(self, hgt):
+        """Creates a new LevelTable.
+
+        :param hgt: Geopotential heights in meters, as an array or masked array of shape (level, y, x).
+        """
+        self._n_levels = hgt.shape[0]
+        columns = np.asarray(np.ma.filled(hgt, np.nan), dtype=np.float64)
+        columns = columns.reshape(self._n_levels, -1).T.copy()
+        with np.errstate(invalid='ignore'):
+            self._valid = np.all(np.isfinite(columns), axis=1) & \
+                np.all(np.diff(columns, axis=1) > 0, axis=1)
+        # Invalid columns keep a sorted placeholder, so the keys as a whole stay sorted
+        columns[~self._valid] = np.arange(self._n_levels)
+        self._bottom = float(np.min(columns))
+        self._span = float(np.max(columns)) - self._bottom + 1
+        offsets = self._span * np.arange(columns.shape[0])
+        self._keys = (columns - self._bottom + offsets[:, None]).ravel()
+        self._keys.flags.writeable = False
+
+    def bracket(self, k, heights):
+        """Finds the levels surrounding the given heights.
+
+        :param k: Array of flattened grid indices.
+        :param heights: Array of heights in meters.
+        :return: Tuple of arrays (low, high, coeff, bottom, top), containing the indices of the
+                 levels below and above each height, the interpolation coefficient of the upper
+                 level clipped to [0, 1], and the heights of the lowest and highest levels, which
+                 are NaN for invalid columns.
+        """
+        first = k * self._n_levels
+        offsets = k * self._span
+        shifted = np.clip(heights - self._bottom, 0, self._span - 1)
+        count = np.searchsorted(self._keys, offsets + shifted, side='right') - first
+        high = np.clip(count, 1, self._n_levels - 1)
+        low = high - 1
+        hgt_low = self._keys[first + low] - offsets + self._bottom
+        hgt_high = self._keys[first + high] - offsets + self._bottom
+        coeff = np.clip((heights - hgt_low) / (hgt_high - hgt_low), 0, 1)
+        valid = self._valid[k]
+        bottom = np.where(valid, self._keys[first] - offsets + self._bottom, np.nan)
+        top = np.where(valid, self._keys[first + self._n_levels - 1] - offsets + self._bottom, np.nan)
+        return low, high, coeff, bottom, top
+
+    @property
+    def nbytes(self):
+        return self._keys.nbytes + self._valid.nbytes
+
+
+class StitchedDataset:
+    """Presents a sequence of datasets covering consecutive time ranges as a single dataset.
+
+    Variables with a time dimension are stitched into one timeline, and each time index is
+    read from the dataset that contains it, so only the slabs that are actually read are
+    ever loaded into memory. Other variables, such as the grid coordinates, are read from
+    the first dataset.
+    """
+
+    def __init__(self, datasets):
+        """Creates a new StitchedDataset.
+
+        :param datasets: Datasets in any order. Their time ranges must not overlap.
+        """
+        self._datasets = sorted(datasets, key=lambda data: float(data['time'][0]))
+        times = [np.asarray(data['time'][:], dtype=np.float64) for data in self._datasets]
+        self._time = np.concatenate(times)
+        if np.any(np.diff(self._time) <= 0):
+            raise ValueError('Stitched datasets must cover consecutive, non-overlapping time ranges.')
+        self._time.flags.writeable = False
+        self._starts = np.cumsum([0] + [len(time) for time in times])
+        self._variables = {}
+
+    @classmethod
+    def open(cls, paths):
+        """Opens the weather files or converted weather directories at the given paths.
+
+        :param paths: Paths to stitch together.
+        :return: The new StitchedDataset
+        """
+        return cls([open_dataset(path) for path in paths])
+
+    def __getitem__(self, name: str):
+        if name == 'time':
+            return self._time
+        if name in ('level', 'lat', 'lon'):
+            return self._datasets[0][name]
+        if name not in self._variables:
+            self._variables[name] = StitchedVariable(
+                [data[name] for data in self._datasets], self._starts)
+        return self._variables[name]
+
+    def close(self):
+        """Closes every stitched dataset."""
+        self._variables = {}
+        close_datasets(self._datasets)
+
+
+class StitchedVariable:
+    """Time-dependent variable of a StitchedDataset. Supports indexing by a single time index."""
+
+    def __init__(self, variables, starts):
+        """Creates a new StitchedVariable.
+
+        :param variables: Variable in each of the stitched datasets, in time order.
+        :param starts: Index of the first time step of each dataset, followed by the total number
+                       of time steps.
+        """
+        self._variables = variables
+        self._starts = starts
+        self.shape = (int(starts[-1]),) + tuple(variables[0].shape[1:])
+
+    def __getitem__(self, t):
+        t = int(t)
+        if t < 0:
+            t += self.shape[0]
+        if not 0 <= t < self.shape[0]:
+            raise IndexError('Time index {} is out of range.'.format(t))
+        file_ind = int(np.searchsorted(self._starts, t, side='right')) - 1
+        return self._variables[file_ind][t - self._starts[file_ind]]
+
+
+def open_dataset(path: str):
+    """Opens a netCDF weather file, or a directory created by NpyDataset.convert.
+
+    :param path: Path to open.
+    :return: Dataset or NpyDataset.
+    """
+    if os.path.isdir(path):
+        return NpyDataset(path)
+    return Dataset(path, 'r')
+
+
+def open_datasets(paths):
+    """Opens the tke, uwnd, vwnd and hgt data at the given paths. Variables stored at the same
+    paths share one dataset, and variables stored at several paths are stitched together.
+
+    :param paths: List of four lists, of the weather files or converted weather directories
+                  containing the tke, uwnd, vwnd and hgt variables.
+    :return: List of the tke, uwnd, vwnd and hgt datasets.
+    """
+    opened = {}
+    for variable_paths in paths:
+        key = tuple(variable_paths)
+        if key not in opened:
+            opened[key] = open_dataset(key[0]) if len(key) == 1 else StitchedDataset.open(key)
+    return [opened[tuple(variable_paths)] for variable_paths in paths]
+
+
+def close_datasets(datasets):
+    """Closes the given datasets, such as those returned by open_datasets. Datasets shared by
+    several variables are only closed once.
+
+    :param datasets: Datasets to close.
+    """
+    closed = set()
+    for data in datasets:
+        if id(data) not in closed:
+            closed.add(id(data))
+            data.close()
+
+
+class SharedWeather:
+    """Weather shared by every process of a simulation.
+
+    The weather data is passed by the paths it is stored at, and each process opens it itself, so
+    converted weather directories are memory-mapped and shared through the operating system's
+    page cache, and netCDF files are only read a sliding window at a time. The grid raster is
+    copied into shared memory once, so that other processes neither rebuild nor load it.
+
+    The process which creates a SharedWeather owns its memory. Other processes attach to it
+    with the picklable handle, and see a read-only raster.
+    """
+
+    def __init__(self, paths, memory: shared_memory.SharedMemory, raster: dict, owner: bool):
+        """Creates a new SharedWeather over an existing shared memory block. Use create or attach
+        instead of calling this directly.
+
+        :param paths: Paths of the tke, uwnd, vwnd and hgt data, as described by open_datasets.
+        :param memory: Shared memory block holding the table of the grid raster.
+        :param raster: Table shape, grid shape, lat_min and resolution of the shared grid raster.
+        :param owner: Whether this process created the memory and is responsible for unlinking it.
+        """
+        self._paths = [list(variable_paths) for variable_paths in paths]
+        self._memory = memory
+        self._raster = raster
+        self._owner = owner
+        table = np.ndarray(raster['table_shape'], dtype=np.int32, buffer=memory.buf)
+        table.flags.writeable = False
+        self._grid_index = GridRaster(table, raster['shape'], raster['lat_min'],
+                                      raster['resolution'])
+
+    @classmethod
+    def create(cls, paths, grid_index: GridRaster):
+        """Copies a grid raster into a new shared memory block.
+
+        :param paths: Paths of the tke, uwnd, vwnd and hgt data, as described by open_datasets.
+        :param grid_index: GridRaster of the weather grid.
+        :return: The new SharedWeather, owned by this process.
+        """
+        table = np.asarray(grid_index.table, dtype=np.int32)
+        memory = shared_memory.SharedMemory(create=True, size=max(1, table.nbytes))
+        try:
+            np.ndarray(table.shape, dtype=np.int32, buffer=memory.buf)[...] = table
+        except BaseException:
+            memory.close()
+            memory.unlink()
+            raise
+        return cls(paths, memory, {'table_shape': table.shape, 'shape': grid_index.shape,
+                                   'lat_min': grid_index.lat_min,
+                                   'resolution': grid_index.resolution}, True)
+
+    @classmethod
+    def attach(cls, handle: dict):
+        """Attaches to shared weather created by another process.
+
+        :param handle: Value of the handle property of the SharedWeather to attach to.
+        :return: SharedWeather with a read-only view of the shared raster.
+        """
+        return cls(handle['paths'], shared_memory.SharedMemory(name=handle['memory']),
+                   handle['raster'], False)
+
+    def open_datasets(self):
+        """Opens the weather data in this process.
+
+        :return: List of the tke, uwnd, vwnd and hgt datasets.
+        """
+        return open_datasets(self._paths)
+
+    def close(self):
+        """Detaches from the shared memory, and frees it if this process created it. The grid
+        raster of this instance must not be used afterwards."""
+        self._grid_index = None
+        if self._memory is not None:
+            self._memory.close()
+            if self._owner:
+                self._memory.unlink()
+            self._memory = None
+
+    @property
+    def handle(self):
+        """Picklable description of the weather paths and shared memory block, to pass to attach."""
+        return {'paths': self._paths, 'memory': self._memory.name, 'raster': self._raster}
+
+    @property
+    def paths(self):
+        return self._paths
+
+    @property
+    def grid_index(self):
+        """GridRaster reading its table from shared memory."""
+        return self._grid_index
+
+    @property
+    def nbytes(self):
+        """Size of the shared raster in bytes."""
+        return self._grid_index.table.nbytes
+
+
+class Prefetcher(threading.Thread):
+    """Background thread which loads time slabs into a cache ahead of when they are needed."""
+
+    def __init__(self, load):
+        """Creates a new Prefetcher.
+
+        :param load: Function loading everything needed at a time index into the cache.
+        """
+        super(Prefetcher, self).__init__(daemon=True)
+        self._load = load
+        self._requests = queue.Queue()
+        self._latest = -1
 
-    def get_predictors(self):
-        return self.index_1_reg, self.index_2_reg
+    def request(self, first: int, last: int):
+        """Queues the time indices in the given inclusive range which have not been requested yet."""
+        for t in range(max(first, self._latest + 1), last + 1):
+            self._requests.put(t)
+            self._latest = t
+
+    def stop(self):
+        """Stops this thread once the time index being loaded, if any, has been loaded. Time
+        indices which are still queued are skipped."""
+        try:
+            while True:
+                self._requests.get_nowait()
+        except queue.Empty:
+            pass
+        self._requests.put(None)
+
+    def run(self):
+        while True:
+            t = self._requests.get()
+            if t is None:
+                return
+            try:
+                self._load(t)
+            except Exception as e:
+                print('prefetching time index {} failed: {}'.format(t, e))
 
 
 class WeatherModel:
     """Wrapper class for weather file.
     """
 
-    def __init__(self, tke: Dataset, uwnd: Dataset, vwnd: Dataset, hgt: Dataset, index_predictor: IndexPredictor=None):
+    def __init__(self, tke: Dataset, uwnd: Dataset, vwnd: Dataset, hgt: Dataset, grid_index=None,
+                 cache_bytes: int=2 ** 30, prefetch: int=0):
         """Creates a new WeatherModel with the given file that returns the given attribute.
 
         :param file: File to return the data from.
+        :param grid_index: GridIndex or GridRaster used to locate points on the grid.
+        :param cache_bytes: Memory budget in bytes for time slabs held in memory.
+        :param prefetch: Number of time steps past the latest requested one to load in the background.
+                         If positive, slabs before the earliest time step in use are also evicted, so
+                         only a sliding window of the weather data stays in memory.
+        :raises ValueError: If the datasets do not share the same time steps.
         """
         self._start_date = datetime(
             year=1800, month=1, day=1, hour=0, minute=0, second=0)
@@ -94,16 +693,26 @@ class WeatherModel:
         self._uwnd = uwnd
         self._vwnd = vwnd
         self._hgt = hgt
+        self._datasets = {'tke': tke, 'uwnd': uwnd, 'vwnd': vwnd, 'hgt': hgt}
+        self._cache = SlabCache(self._datasets, cache_bytes)
+        self._times = np.array(self._tke['time'][:], dtype=np.float64)
+        for name, data in self._datasets.items():
+            if not np.array_equal(np.asarray(data['time'][:], dtype=np.float64), self._times):
+                raise ValueError('The time steps of the {} data differ from those of the tke data.'
+                                 .format(name))
         self._min_time = self._start_date + \
-            timedelta(hours=self._tke['time'].actual_range[0])
+            timedelta(hours=float(self._times[0]))
         self._max_time = self._start_date + \
-            timedelta(hours=self._tke['time'].actual_range[1])
-        self._max_level, self._min_level = self._tke['level'].actual_range
-        if index_predictor is None:
-            self._index_predictor = IndexPredictor(
-                self._tke['lat'], self._tke['lon'])
+            timedelta(hours=float(self._times[-1]))
+        if grid_index is None:
+            self._grid_index = GridIndex(self._tke['lat'], self._tke['lon'])
         else:
-            self._index_predictor = index_predictor
+            self._grid_index = grid_index
+        self._prefetch = prefetch
+        self._prefetcher = None
+        if prefetch > 0:
+            self._prefetcher = Prefetcher(self._load)
+            self._prefetcher.start()
 
     def get_weather(self, lat: float, lon: float, height: float, time: datetime):
         """Returns the given attribute at the given coordinates, which may be interpolated from multiple values.
@@ -112,78 +721,119 @@ class WeatherModel:
         :param lon: Longitude of value to return.
         :param height: Height in meters.
         :param time: Date and time of value to return.
-        :return: tke, uwnd and vwnd at the given coordinates.
+        :return: tke, uwnd and vwnd at the given coordinates, or None if they are outside of the weather file.
         """
-        lat = (lat + 90) % 180 - 90
-        lon = (lon + 180) % 360 - 180
-
-        if time < self._min_time or time > self._max_time:
-            return None
-        indices = self._index_predictor.predict([(lat, lon)])[0]
-        if indices is None:
-            return None
-        i, j = indices
-
-        start_time = self._start_date + timedelta(hours=self._tke['time'][0])
-        end_time = self._start_date + timedelta(hours=self._tke['time'][-1])
-        time_ind_exact = (self._tke['time'].shape[0] - 1) * (time - start_time).total_seconds() \
-            / (end_time - start_time).total_seconds()
-        time_ind_low = floor(time_ind_exact)
-        time_ind_high = ceil(time_ind_exact)
-        time_ind_coeff_1 = 1 if time_ind_low == time_ind_high else float(time_ind_exact - time_ind_low) \
-            / float(time_ind_high - time_ind_low)
-        time_ind_coeff_2 = 1 - time_ind_coeff_1
-
-        hgt_min = min(self._hgt['hgt'][time_ind_low, 0, i, j],
-                      self._hgt['hgt'][time_ind_high, 0, i, j])
-        hgt_max = max(self._hgt['hgt'][time_ind_low, -1, i, j],
-                      self._hgt['hgt'][time_ind_high, -1, i, j])
-
-        if height > hgt_max or height < hgt_min:
+        tke, uwnd, vwnd, valid = self.get_weather_batch(
+            [lat], [lon], [height], [time])
+        if not valid[0]:
             return None
+        return float(tke[0]), float(uwnd[0]), float(vwnd[0])
+
+    def get_weather_batch(self, lats, lons, heights, times):
+        """Returns the weather at many coordinates at once, linearly interpolated in time and
+        height between the surrounding time steps and pressure levels.
+
+        :param lats: Array of latitudes.
+        :param lons: Array of longitudes.
+        :param heights: Array of heights in meters.
+        :param times: Array of dates and times, as datetimes or datetime64 values.
+        :return: Tuple of arrays (tke, uwnd, vwnd, valid). valid is False for coordinates outside
+                 of the weather file, whose values are NaN.
+        """
+        lats = (np.asarray(lats, dtype=np.float64) + 90) % 180 - 90
+        lons = (np.asarray(lons, dtype=np.float64) + 180) % 360 - 180
+        heights = np.asarray(heights, dtype=np.float64)
+        hours = (np.asarray(times, dtype='datetime64[us]') - np.datetime64(self._start_date)) \
+            / np.timedelta64(1, 'h')
+
+        i, j, valid = self._grid_index.locate(lats, lons)
+        valid = valid & (hours >= self._times[0]) & (hours <= self._times[-1])
+        tke = np.full(lats.shape, np.nan)
+        uwnd = np.full(lats.shape, np.nan)
+        vwnd = np.full(lats.shape, np.nan)
+
+        idx = np.flatnonzero(valid)
+        i, j, heights = i.ravel()[idx], j.ravel()[idx], heights.ravel()[idx]
+        time_ind_exact = np.interp(
+            hours.ravel()[idx], self._times, np.arange(len(self._times)))
+        time_ind_low = np.minimum(np.floor(time_ind_exact).astype(np.intp),
+                                  len(self._times) - 1)
+        time_ind_high = np.minimum(time_ind_low + 1, len(self._times) - 1)
+        if self._prefetcher is not None and len(idx) > 0:
+            self._cache.evict_before(int(np.min(time_ind_low)))
+            last = int(np.max(time_ind_high))
+            self._prefetcher.request(last + 1, min(last + self._prefetch, len(self._times) - 1))
+        k = np.ravel_multi_index((i, j), self._grid_index.shape)
+        time_coeff = time_ind_exact - time_ind_low
+        level_low_1, level_high_1, level_coeff_1, bottom_1, top_1 = self._levels(
+            time_ind_low, k, heights)
+        level_low_2, level_high_2, level_coeff_2, bottom_2, top_2 = self._levels(
+            time_ind_high, k, heights)
+        in_range = (heights >= np.minimum(bottom_1, bottom_2)) & (
+            heights <= np.maximum(top_1, top_2))
+
+        weights = ((1 - time_coeff) * (1 - level_coeff_1), (1 - time_coeff) * level_coeff_1,
+                   time_coeff * (1 - level_coeff_2), time_coeff * level_coeff_2)
+        corners = ((time_ind_low, level_low_1), (time_ind_low, level_high_1),
+                   (time_ind_high, level_low_2), (time_ind_high, level_high_2))
+        for name, out in (('tke', tke), ('uwnd', uwnd), ('vwnd', vwnd)):
+            value = sum(weight * self._values(name, t, l, i, j)
+                        for weight, (t, l) in zip(weights, corners))
+            out.ravel()[idx] = np.where(in_range, value, np.nan)
+        valid.ravel()[idx] = in_range
+        return tke, uwnd, vwnd, valid
+
+    def close(self):
+        """Stops prefetching in the background, and closes the datasets once the slab being
+        prefetched, if any, has been loaded. The model must not be used afterwards."""
+        if self._prefetcher is not None:
+            self._prefetcher.stop()
+            self._prefetcher.join()
+            self._prefetcher = None
+        if self._datasets:
+            self._cache.clear()
+            close_datasets(self._datasets.values())
+            self._datasets = {}
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def _load(self, t: int):
+        """Loads every slab needed at a time index into the cache."""
+        for name in ('tke', 'uwnd', 'vwnd', 'hgt'):
+            self._slab(name, t)
+        self._cache.get('hgt_levels', t, self._level_table)
+
+    def _slab(self, name: str, t: int):
+        """Returns all levels and grid points of a variable at a single time index.
+
+        :param name: Variable name.
+        :param t: Time index.
+        :return: Array of shape (level, y, x).
+        """
+        return self._cache.get(name, t)
+
+    def _levels(self, t, k, heights):
+        """Finds the levels surrounding the given heights at each of the given time and flattened
+        grid indices. See LevelTable.bracket for the returned values."""
+        out = tuple(np.empty(len(t), dtype=dtype)
+                    for dtype in (np.intp, np.intp, np.float64, np.float64, np.float64))
+        for time_ind in np.unique(t):
+            selected = t == time_ind
+            table = self._cache.get('hgt_levels', time_ind, self._level_table)
+            for array, values in zip(out, table.bracket(k[selected], heights[selected])):
+                array[selected] = values
+        return out
+
+    def _level_table(self, t: int):
+        return LevelTable(self._slab('hgt', t))
 
-        height_ind_high = -1
-        height_ind_low = -1
-        for l in range(self._hgt['hgt'].shape[1]):
-            if self._hgt['hgt'][time_ind_low, l, i, j] > height:
-                height_ind_high = l + 1
-                height_ind_low = l
-                break
-
-        level_slope = self._hgt['hgt'][time_ind_low, height_ind_high, i, j] -\
-            self._hgt['hgt'][time_ind_low, height_ind_low, i, j]
-        level_ind_exact = float(
-            (height - self._hgt['hgt'][time_ind_low, height_ind_low, i, j])) / level_slope
-        level_ind_low = floor(level_ind_exact)
-        level_ind_high = ceil(level_ind_exact)
-        level_ind_coeff_1 = 1 if level_ind_low == level_ind_high else float(level_ind_exact - level_ind_low)\
-            / float(level_ind_high - level_ind_low)
-        level_ind_coeff_2 = 1 - level_ind_coeff_1
-
-        """
-        level_ind_exact = float((self._tke['level'].shape[0] - 1) * (level - self._tke['level'][0]))\
-            / float((self._tke['level'][self._tke['level'].shape[0] - 1] - self._tke['level'][0]))
-        level_ind_low = floor(level_ind_exact)
-        level_ind_high = ceil(level_ind_exact)
-        level_ind_coeff_1 = 1 if level_ind_low == level_ind_high else float(level_ind_exact - level_ind_low)\
-            / float(level_ind_high - level_ind_low)
-        level_ind_coeff_2 = 1 - level_ind_coeff_1
-        """
-
-        tke = level_ind_coeff_1 * time_ind_coeff_1 * self._tke['tke'][time_ind_low, level_ind_low, i, j]\
-            + level_ind_coeff_1 * time_ind_coeff_2 * self._tke['tke'][time_ind_high, level_ind_low, i, j]\
-            + level_ind_coeff_2 * time_ind_coeff_1 * self._tke['tke'][time_ind_low, level_ind_high, i, j]\
-            + level_ind_coeff_2 * time_ind_coeff_2 * \
-            self._tke['tke'][time_ind_high, level_ind_high, i, j]
-        uwnd = level_ind_coeff_1 * time_ind_coeff_1 * self._uwnd['uwnd'][time_ind_low, level_ind_low, i, j] \
-            + level_ind_coeff_1 * time_ind_coeff_2 * self._uwnd['uwnd'][time_ind_high, level_ind_low, i, j] \
-            + level_ind_coeff_2 * time_ind_coeff_1 * self._uwnd['uwnd'][time_ind_low, level_ind_high, i, j] \
-            + level_ind_coeff_2 * time_ind_coeff_2 * \
-            self._uwnd['uwnd'][time_ind_high, level_ind_high, i, j]
-        vwnd = level_ind_coeff_1 * time_ind_coeff_1 * self._vwnd['vwnd'][time_ind_low, level_ind_low, i, j] \
-            + level_ind_coeff_1 * time_ind_coeff_2 * self._vwnd['vwnd'][time_ind_high, level_ind_low, i, j] \
-            + level_ind_coeff_2 * time_ind_coeff_1 * self._vwnd['vwnd'][time_ind_low, level_ind_high, i, j] \
-            + level_ind_coeff_2 * time_ind_coeff_2 * \
-            self._vwnd['vwnd'][time_ind_high, level_ind_high, i, j]
-
-        return tke, uwnd, vwnd
+    def _values(self, name: str, t, l, i, j):
+        """Returns the values of a variable at each of the given time, level and grid indices."""
+        out = np.empty(len(t))
+        for time_ind in np.unique(t):
+            selected = t == time_ind
+            out[selected] = self._slab(name, time_ind)[
+                l[selected], i[selected], j[selected]]
+        return out
@@ -3,9 +3,15 @@ import os
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 FLIGHTS_DIR = ROOT_DIR + '/Flight_Statistics/Flights.csv'
 WEATHER_DATA_DIR = ROOT_DIR + '/Weather_Data/all.201708_week1.nc'
+WEATHER_NATIVE_DIR = ROOT_DIR + '/Weather_Data/all.201708_week1'
 TKE_DIR = ROOT_DIR + '/Weather_Data/tke.201708.nc'
 UWND_DIR = ROOT_DIR + '/Weather_Data/uwnd.201708.nc'
 VWND_DIR = ROOT_DIR + '/Weather_Data/vwnd.201708.nc'
 HGT_DIR = ROOT_DIR + '/Weather_Data/hgt.201708.nc'
+WEATHER_FILE_PATTERNS = [ROOT_DIR + '/Weather_Data/tke.*.nc',
+                         ROOT_DIR + '/Weather_Data/uwnd.*.nc',
+                         ROOT_DIR + '/Weather_Data/vwnd.*.nc',
+                         ROOT_DIR + '/Weather_Data/hgt.*.nc']
 AIRPORTS_DIR = ROOT_DIR + '/Flight_Statistics/Airport_Locations.csv'
-INDEX_REGRESSION_DIR = ROOT_DIR + '/index_reg.pickle'
+GRID_CACHE_DIR = ROOT_DIR + '/Weather_Data/grid_cache'
+CHECKPOINT_DIR = ROOT_DIR + '/checkpoint'
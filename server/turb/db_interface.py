@@ -1,73 +1,525 @@
 from .models import *
+from collections import namedtuple
 from datetime import datetime, timedelta
+from django.db import OperationalError, connection, transaction
+from django.db.models import Max
 from .WeatherReportSimulator import Simulator
+from .live_state import LiveState, ReportChunk, live_state
+import numpy as np
 import pytz
+import queue
+import threading
+import time
+import traceback
 
 
-def add_aircraft(aircraft: Simulator.Aircraft) -> Aircraft:
-    in_db = Aircraft.objects.filter(aircraft_type=aircraft.name,
-                                    weight=aircraft.weight)
-    if in_db.exists():
-        model = in_db[0]
-    else:
-        model = Aircraft(aircraft_type=aircraft.name, weight=aircraft.weight)
-        model.save()
-    aircraft.db_id = model.id
-    return model
-
-
-def add_airport(airport: Simulator.Airport) -> Airport:
-    in_db = Airport.objects.filter(airport_code=airport.code)
-    if in_db.exists():
-        model = in_db[0]
-    else:
-        model = Airport(airport_code=airport.code, airport_name=airport.name,
-                        latitude=airport.lat, longitude=airport.lon,
-                        altitude=airport.alt)
-        model.save()
-    airport.db_id = model.id
-    return model
-
-
-def add_flight(flight: Simulator.Flight, active: bool) -> Flight:
-    origin = add_airport(flight.origin)
-    dest = add_airport(flight.dest)
-    aircraft = add_aircraft(flight.plane)
-    in_db = Flight.objects.filter(origin=origin, destination=dest,
-                                  identifier=flight.identifier)
-    if in_db.exists():
-        model = in_db[0]
-    else:
-        model = Flight(start_time=flight.start_time.replace(tzinfo=pytz.UTC),
-                       origin=origin, destination=dest, latitude=flight.lat,
-                       longitude=flight.lon, altitude=flight.alt,
-                       bearing=flight.bearing, aircraft=aircraft,
-                       active=active, identifier=flight.identifier)
-        model.save()
-    flight.db_id = model.id
-    return model
-
-
-def update_flight(flight: Simulator.Flight, active: bool):
-    if flight.db_id is None:
-        add_flight(flight, active)
-    else:
-        Flight.objects.filter(id=flight.db_id).update(
-            latitude=flight.lat,
-            longitude=flight.lon,
-            bearing=flight.bearing,
-            altitude=flight.alt,
-            active=active
-        )
-
-
-def add_report(report: Simulator.WeatherReport) -> WeatherReport:
-    flight = add_flight(report.flight, True)
-    model = WeatherReport(time=report.time.replace(tzinfo=pytz.UTC),
-                          flight=flight, latitude=report.lat,
-                          longitude=report.lon, altitude=report.alt,
-                          wind_x=report.wind_x, wind_y=report.wind_y,
-                          tke=report.tke)
-    model.save()
-    report.db_id = model.id
-    return model
+class IdentityMap:
+    """Primary keys of the rows written by a DatabaseWriter, by the simulator entities they stand
+    for. Airports are keyed by code, aircraft by name and weight, and flights by id, since the
+    simulator objects reaching the database are often copies received from worker processes.
+
+    Completed flights are kept until purge deletes them, since reports naming them can still be
+    written. Primary keys of new rows are also reserved here, so the simulation must be the only
+    writer of these tables, and the map must be cleared whenever the tables are emptied.
+    """
+
+    def __init__(self):
+        self.airports = {}
+        self.aircraft = {}
+        self.flights = {}
+        self._next_ids = {}
+        self._loaded = False
+
+    def load(self):
+        """Reads the keys of every airport and aircraft type in the database, if they have not
+        been read since the map was last cleared. Airports and aircraft missing from a loaded map
+        are not in the database."""
+        if self._loaded:
+            return
+        self.airports.update(Airport.objects.values_list('airport_code', 'id'))
+        self.aircraft.update(((name, weight), db_id) for db_id, name, weight
+                             in Aircraft.objects.values_list('id', 'aircraft_type', 'weight'))
+        self._loaded = True
+
+    def allocate(self, model, count: int=1) -> range:
+        """Reserves primary keys for new rows of a model, reading the largest key in use the
+        first time.
+
+        :param model: Model class of the new rows.
+        :param count: Number of keys to reserve.
+        :return: Range of the reserved keys.
+        """
+        if model not in self._next_ids:
+            self._next_ids[model] = (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+        start = self._next_ids[model]
+        self._next_ids[model] += count
+        return range(start, start + count)
+
+    def forget_flights(self, db_ids):
+        """Forgets the flights with the given primary keys, once their rows have been deleted.
+
+        :param db_ids: Set of the primary keys of the deleted flights.
+        """
+        if db_ids:
+            self.flights = {flight_id: db_id for flight_id, db_id in self.flights.items()
+                            if db_id not in db_ids}
+
+    def clear(self):
+        """Forgets every primary key."""
+        self.airports.clear()
+        self.aircraft.clear()
+        self.flights.clear()
+        self._next_ids.clear()
+        self._loaded = False
+
+
+# Identity map of the writes which are not made through a DatabaseWriter
+_identity_map = IdentityMap()
+
+
+def clear_identity_map():
+    """Forgets the primary keys in the identity map shared by the writes which are not made
+    through a DatabaseWriter. Must be called whenever the simulation tables are emptied."""
+    _identity_map.clear()
+
+
+# Position and state of a flight at the end of an iteration
+FlightState = namedtuple('FlightState', ['flight', 'lat', 'lon', 'alt', 'bearing', 'active'])
+
+
+def flight_states(active_flights, removed_flights) -> list:
+    """Captures the current positions of flights, so that they can be written after the
+    simulation has moved the flights on.
+
+    :param active_flights: Flights which are still active.
+    :param removed_flights: Flights which have completed.
+    :return: List of FlightStates.
+    """
+    return [FlightState(flight, flight.lat, flight.lon, flight.alt, flight.bearing, active)
+            for flights, active in ((active_flights, True), (removed_flights, False))
+            for flight in flights]
+
+
+def save_flight_states(states, reports: Simulator.ReportBatch, identity_map: IdentityMap=None):
+    """Writes flight states and reports to the database in a single transaction. New airports,
+    aircraft, flights and reports are inserted with bulk_create, and the positions of flights
+    already in the database are changed with bulk_update, so a write takes a handful of
+    statements however many flights and reports it has.
+
+    Primary keys are resolved through an identity map, which reads the airports and aircraft
+    types in the database on the first call, so no SELECT queries are run after it unless a
+    report names a flight which is neither in states nor in the map. The identity map and the
+    db_id of the simulator objects are only updated once the transaction commits.
+
+    :param states: FlightStates of the flights to insert or update, with at most one per flight.
+    :param reports: ReportBatch of new reports, whose flights must be in the database or in states.
+    :param identity_map: IdentityMap to resolve primary keys with, or None to use the one shared
+                         by the writes which are not made through a DatabaseWriter.
+    :return: Tuple containing the primary keys of the reports, and of their flights.
+    """
+    if identity_map is None:
+        identity_map = _identity_map
+    flight_ids = {state.flight.id: identity_map.flights.get(state.flight.id) for state in states}
+    new_states = [state for state in states if flight_ids[state.flight.id] is None]
+    identity_map.load()
+    with transaction.atomic():
+        airport_ids = _bulk_add_airports([airport for state in new_states
+                                          for airport in (state.flight.origin, state.flight.dest)],
+                                         identity_map)
+        aircraft_ids = _bulk_add_aircraft([state.flight.plane for state in new_states],
+                                          identity_map)
+        models = []
+        for state, db_id in zip(new_states, identity_map.allocate(Flight, len(new_states))):
+            flight = state.flight
+            models.append(Flight(id=db_id, start_time=flight.start_time.replace(tzinfo=pytz.UTC),
+                                 origin_id=airport_ids[flight.origin.code],
+                                 destination_id=airport_ids[flight.dest.code],
+                                 latitude=state.lat, longitude=state.lon, altitude=state.alt,
+                                 bearing=state.bearing,
+                                 aircraft_id=aircraft_ids[flight.plane.name, flight.plane.weight],
+                                 active=state.active, identifier=flight.identifier))
+            flight_ids[flight.id] = db_id
+        Flight.objects.bulk_create(models)
+        Flight.objects.bulk_update(
+            [Flight(id=flight_ids[state.flight.id], latitude=state.lat, longitude=state.lon,
+                    altitude=state.alt, bearing=state.bearing, active=state.active)
+             for state in states if state.flight.id in identity_map.flights],
+            ['latitude', 'longitude', 'altitude', 'bearing', 'active'])
+        report_ids = identity_map.allocate(WeatherReport, len(reports))
+        stored_ids = _find_flights(set(reports.flight_id.tolist()) - flight_ids.keys()
+                                   - identity_map.flights.keys())
+        report_flight_ids = [flight_ids[flight_id] if flight_id in flight_ids
+                             else identity_map.flights.get(flight_id, stored_ids.get(flight_id))
+                             for flight_id in reports.flight_id.tolist()]
+        columns = [getattr(reports, column).tolist() for column in Simulator.ReportBatch.COLUMNS
+                   if column != 'flight_id']
+        WeatherReport.objects.bulk_create(
+            WeatherReport(id=db_id, time=report_time.replace(tzinfo=pytz.UTC),
+                          flight_id=flight_id, latitude=lat, longitude=lon,
+                          altitude=alt, wind_x=wind_x, wind_y=wind_y, tke=tke)
+            for db_id, flight_id, (report_time, lat, lon, alt, wind_x, wind_y, tke)
+            in zip(report_ids, report_flight_ids, zip(*columns)))
+    identity_map.airports.update(airport_ids)
+    identity_map.aircraft.update(aircraft_ids)
+    identity_map.flights.update(stored_ids)
+    for state in states:
+        flight = state.flight
+        flight.db_id = flight_ids[flight.id]
+        flight.origin.db_id = airport_ids.get(flight.origin.code, flight.origin.db_id)
+        flight.dest.db_id = airport_ids.get(flight.dest.code, flight.dest.db_id)
+        flight.plane.db_id = aircraft_ids.get((flight.plane.name, flight.plane.weight),
+                                              flight.plane.db_id)
+        identity_map.flights[flight.id] = flight.db_id
+    return report_ids, report_flight_ids
+
+
+def _find_flights(flight_ids) -> dict:
+    """Reads the primary keys of flights which are in the database but not in the identity map.
+
+    :param flight_ids: Set of the simulator ids of the flights.
+    :return: Dictionary from the given flight ids to primary keys.
+    :raises ValueError: If any of the flights is not in the database.
+    """
+    if not flight_ids:
+        return {}
+    ids = {int(identifier): db_id for identifier, db_id in Flight.objects.filter(
+        identifier__in=[str(flight_id) for flight_id in flight_ids]).values_list('identifier', 'id')}
+    missing = flight_ids - ids.keys()
+    if missing:
+        raise ValueError('Weather reports name flights which are not in the database: {}'.format(
+            ', '.join(str(flight_id) for flight_id in sorted(missing))))
+    return ids
+
+
+def _bulk_add_airports(airports, identity_map: IdentityMap) -> dict:
+    """Inserts the given airports which are missing from the loaded identity map.
+
+    :return: Dictionary from the codes of the given airports to primary keys.
+    """
+    ids = {}
+    missing = {}
+    for airport in airports:
+        db_id = identity_map.airports.get(airport.code)
+        if db_id is None:
+            missing[airport.code] = airport
+        else:
+            ids[airport.code] = db_id
+    missing = list(missing.values())
+    models = [Airport(id=db_id, airport_code=airport.code, airport_name=airport.name,
+                      latitude=airport.lat, longitude=airport.lon, altitude=airport.alt)
+              for airport, db_id in zip(missing, identity_map.allocate(Airport, len(missing)))]
+    Airport.objects.bulk_create(models)
+    ids.update((model.airport_code, model.id) for model in models)
+    return ids
+
+
+def _bulk_add_aircraft(aircraft, identity_map: IdentityMap) -> dict:
+    """Inserts the given aircraft types which are missing from the loaded identity map.
+
+    :return: Dictionary from the (name, weight) tuples of the given aircraft to primary keys.
+    """
+    ids = {}
+    missing = {}
+    for plane in aircraft:
+        key = (plane.name, plane.weight)
+        db_id = identity_map.aircraft.get(key)
+        if db_id is None:
+            missing[key] = plane
+        else:
+            ids[key] = db_id
+    missing = list(missing.values())
+    models = [Aircraft(id=db_id, aircraft_type=plane.name, weight=plane.weight)
+              for plane, db_id in zip(missing, identity_map.allocate(Aircraft, len(missing)))]
+    Aircraft.objects.bulk_create(models)
+    ids.update(((model.aircraft_type, model.weight), model.id) for model in models)
+    return ids
+
+
+def purge(before: datetime, chunk_size: int=10000, identity_map: IdentityMap=None):
+    """Deletes the weather reports received at or before the given time, then the completed
+    flights which have no reports left, which are also removed from the identity map. Reports
+    are deleted by set-based DELETE statements of at most chunk_size rows each, so a large
+    backlog does not hold the database lock for long.
+
+    :param before: Latest time of the reports to delete.
+    :param chunk_size: Maximum number of reports deleted by one statement.
+    :param identity_map: IdentityMap to remove the flights from, or None to use the one shared by
+                         the writes which are not made through a DatabaseWriter.
+    :return: Tuple containing the number of reports and the number of flights deleted.
+    """
+    if identity_map is None:
+        identity_map = _identity_map
+    before = before.replace(tzinfo=pytz.UTC)
+    num_reports = 0
+    while True:
+        chunk = WeatherReport.objects.filter(time__lte=before).values('id')[:chunk_size]
+        deleted, _ = WeatherReport.objects.filter(id__in=chunk).delete()
+        num_reports += deleted
+        if deleted < chunk_size:
+            break
+    finished = Flight.objects.filter(active=False, weatherreport__isnull=True)
+    finished_ids = set(finished.values_list('id', flat=True))
+    _, deleted = finished.delete()
+    identity_map.forget_flights(finished_ids)
+    return num_reports, deleted.get(Flight._meta.label, 0)
+
+
+# Changes of one iteration of a simulation, queued for a DatabaseWriter
+TickDelta = namedtuple('TickDelta', ['time', 'states', 'reports', 'purge_before'])
+
+
+class DatabaseWriter(threading.Thread):
+    """Thread writing the results of a simulation to the database behind it, so that the
+    simulation does not wait for the database.
+
+    Iterations are pushed onto a bounded queue. Whenever the writer is free it takes every
+    queued iteration, coalesces them into one set of flight states, reports and purge time, and
+    writes them in a single transaction, so a slow commit is caught up by the next one. When the
+    queue is full, push blocks until the writer has caught up. If a transaction fails with an
+    OperationalError, such as a locked database, its iterations are kept and written together
+    with the next ones, without the reports which have been purged meanwhile. Iterations which
+    fail for any other reason, or fail more than max_retries times in a row, are dropped, so a
+    permanent error neither holds on to them forever nor stops later iterations from being
+    written.
+
+    Each writer resolves primary keys through an IdentityMap of its own, so a writer which is
+    still finishing does not share it with the writer of the next simulation.
+
+    After every commit the writer publishes a Snapshot of the active flights and unexpired
+    reports to a LiveState, so that the views can serve them without querying the database.
+    """
+
+    # Pragmas for SQLite databases. WAL lets web requests read while the writer commits
+    SQLITE_PRAGMAS = ('PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL',
+                      'PRAGMA temp_store=MEMORY', 'PRAGMA cache_size=-65536')
+
+    def __init__(self, max_queued: int=16, max_coalesced: int=64, state: LiveState=live_state,
+                 close_retries: int=3, max_retries: int=5):
+        """Creates a new writer. It must be started before anything is pushed to it.
+
+        :param max_queued: Maximum number of iterations waiting to be written.
+        :param max_coalesced: Maximum number of iterations written in one transaction.
+        :param state: LiveState to publish snapshots to.
+        :param close_retries: Number of times iterations left unwritten by a failed transaction
+                              are retried, a second apart, when the writer is closed.
+        :param max_retries: Number of times the iterations of a failed transaction are retried
+                            with the next ones before they are dropped.
+        """
+        super(DatabaseWriter, self).__init__(daemon=True)
+        self._queue = queue.Queue(max_queued)
+        self._max_coalesced = max_coalesced
+        self._state = state
+        self._close_retries = close_retries
+        self._max_retries = max_retries
+        self._identity_map = IdentityMap()
+        # Coalesced iterations of a failed transaction, how many iterations they hold, and how
+        # many times in a row they have failed
+        self._unwritten = None
+        self._num_unwritten = 0
+        self._num_failures = 0
+        self._report_chunks = []
+        self._airports = {}
+        self._aircraft = {}
+        self._max_flight_id = 0
+        self._lock = threading.Lock()
+        self._ticks = 0
+        self._commits = 0
+        self._errors = 0
+        self._dropped = 0
+        self._max_depth = 0
+        self._commit_time = 0.0
+        self._last_commit_time = 0.0
+        self._max_commit_time = 0.0
+        self._blocked_time = 0.0
+
+    def push(self, current_time: datetime, active_flights, removed_flights,
+             reports: Simulator.ReportBatch, purge_before: datetime=None):
+        """Queues one iteration of a simulation to be written, blocking while the queue is full.
+        The positions of the flights are captured when they are pushed.
+
+        :param current_time: Simulated time at the end of the iteration.
+        :param active_flights: Flights which are still active.
+        :param removed_flights: Flights which have completed in the iteration.
+        :param reports: ReportBatch of the reports generated in the iteration.
+        :param purge_before: Time at or before which reports are deleted by purge, or None to not purge.
+        """
+        delta = TickDelta(current_time, flight_states(active_flights, removed_flights), reports,
+                          purge_before)
+        start = time.time()
+        self._queue.put(delta)
+        with self._lock:
+            self._blocked_time += time.time() - start
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+
+    def close(self):
+        """Writes everything queued, then stops this thread."""
+        self._queue.put(None)
+        self.join()
+
+    def run(self):
+        self._configure()
+        try:
+            stopped = False
+            while not stopped:
+                deltas = [self._queue.get()]
+                while len(deltas) < self._max_coalesced:
+                    try:
+                        deltas.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if deltas[-1] is None:
+                    stopped = True
+                    deltas.pop()
+                if deltas:
+                    self._write(deltas)
+            for _ in range(self._close_retries):
+                if self._unwritten is None:
+                    break
+                time.sleep(1)
+                self._write([])
+            if self._unwritten is not None:
+                print('{} iterations were not written to the database'.format(self._num_unwritten))
+        finally:
+            connection.close()
+
+    def _configure(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                for pragma in self.SQLITE_PRAGMAS:
+                    cursor.execute(pragma)
+
+    def _write(self, deltas):
+        """Writes coalesced iterations, after any left unwritten by a failed write. The latest
+        state of each flight is written once."""
+        num_ticks = len(deltas) + self._num_unwritten
+        if self._unwritten is not None:
+            deltas = [self._unwritten] + deltas
+        delta = self._coalesce(deltas)
+        start = time.time()
+        try:
+            report_ids, report_flight_ids = save_flight_states(delta.states, delta.reports,
+                                                                  self._identity_map)
+        except Exception as e:
+            self._num_failures += 1
+            retry = isinstance(e, OperationalError) and self._num_failures <= self._max_retries
+            self._unwritten = delta if retry else None
+            with self._lock:
+                self._num_unwritten = num_ticks if retry else 0
+                self._errors += 1
+                if not retry:
+                    self._dropped += num_ticks
+            if retry:
+                print('writing {} iterations failed, retrying with the next ones:\n{}'.format(
+                    num_ticks, traceback.format_exc()))
+            else:
+                self._num_failures = 0
+                print('writing {} iterations failed, dropping them:\n{}'.format(
+                    num_ticks, traceback.format_exc()))
+            return
+        self._unwritten = None
+        self._num_failures = 0
+        with self._lock:
+            self._num_unwritten = 0
+        if delta.purge_before is not None:
+            try:
+                num_reports, num_flights = purge(delta.purge_before,
+                                                 identity_map=self._identity_map)
+                print(str(num_reports) + ' removed reports')
+                print(str(num_flights) + ' removed flights')
+            except Exception:
+                # Purge times only move forward, so the next purge deletes these rows too
+                with self._lock:
+                    self._errors += 1
+                print('purging reports failed:\n' + traceback.format_exc())
+        try:
+            self._publish(delta, ReportChunk(report_ids, report_flight_ids, delta.reports))
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            print('publishing the live state failed:\n' + traceback.format_exc())
+        elapsed = time.time() - start
+        with self._lock:
+            self._ticks += num_ticks
+            self._commits += 1
+            self._commit_time += elapsed
+            self._last_commit_time = elapsed
+            self._max_commit_time = max(self._max_commit_time, elapsed)
+
+    @staticmethod
+    def _coalesce(deltas) -> TickDelta:
+        """Joins consecutive iterations into one, holding the latest state of each flight, the
+        reports which the latest purge time does not delete, and that purge time. Since every
+        active flight is pushed with each iteration, the active flights of the result are those
+        of the last iteration."""
+        states = {}
+        for delta in deltas:
+            for state in delta.states:
+                states[state.flight.id] = state
+        reports = Simulator.ReportBatch.concatenate([delta.reports for delta in deltas])
+        purge_times = [delta.purge_before for delta in deltas if delta.purge_before is not None]
+        purge_before = max(purge_times) if purge_times else None
+        if purge_before is not None:
+            reports = reports[reports.time > np.datetime64(purge_before, 'us')]
+        return TickDelta(deltas[-1].time, list(states.values()), reports, purge_before)
+
+    def _publish(self, delta: TickDelta, chunk: ReportChunk):
+        """Publishes a snapshot of the active flights of the latest written iteration, and of
+        the reports which have not been purged.
+
+        :param delta: Coalesced iterations which have been written.
+        :param chunk: ReportChunk of the reports written with them.
+        """
+        purge_before = delta.purge_before
+        if len(chunk) > 0:
+            self._report_chunks.append(chunk)
+        expired = []
+        if purge_before is not None:
+            chunks = []
+            for chunk in self._report_chunks:
+                after = chunk.after(purge_before)
+                expired.append(chunk.ids[:len(chunk) - len(after)])
+                if len(after) > 0:
+                    chunks.append(after)
+            self._report_chunks = chunks
+        removed = []
+        flights = []
+        for state in delta.states:
+            flight = state.flight
+            self._max_flight_id = max(self._max_flight_id, flight.db_id)
+            if not state.active:
+                removed.append(flight.db_id)
+                continue
+            for airport in (flight.origin, flight.dest):
+                if airport.db_id not in self._airports:
+                    self._airports[airport.db_id] = {
+                        'id': airport.db_id, 'airport_code': airport.code,
+                        'airport_name': airport.name, 'latitude': airport.lat,
+                        'longitude': airport.lon, 'altitude': airport.alt}
+            if flight.plane.db_id not in self._aircraft:
+                self._aircraft[flight.plane.db_id] = {
+                    'id': flight.plane.db_id, 'aircraft_type': flight.plane.name,
+                    'weight': flight.plane.weight}
+            flights.append({'id': flight.db_id,
+                            'start_time': flight.start_time.replace(tzinfo=pytz.UTC),
+                            'origin': flight.origin.db_id, 'destination': flight.dest.db_id,
+                            'latitude': state.lat, 'longitude': state.lon, 'altitude': state.alt,
+                            'bearing': state.bearing, 'aircraft': flight.plane.db_id,
+                            'active': True, 'identifier': flight.identifier})
+        self._state.publish(delta.time, flights, self._report_chunks, self._airports,
+                            self._aircraft, self._max_flight_id, removed,
+                            np.concatenate([np.empty(0, dtype=np.int64)] + expired))
+
+    @property
+    def metrics(self):
+        """Dictionary of statistics of this writer: the current and maximum queue depth in
+        iterations, the number of iterations and transactions written and failed, the number of
+        iterations waiting to be retried and dropped after failing, the last, mean and maximum commit latency in seconds,
+        and the total time push was blocked in seconds."""
+        with self._lock:
+            return {'queue_depth': self._queue.qsize(), 'max_queue_depth': self._max_depth,
+                    'ticks': self._ticks, 'commits': self._commits, 'errors': self._errors,
+                    'unwritten_ticks': self._num_unwritten, 'dropped_ticks': self._dropped,
+                    'last_commit_time': self._last_commit_time,
+                    'mean_commit_time': self._commit_time / self._commits if self._commits else 0.0,
+                    'max_commit_time': self._max_commit_time,
+                    'blocked_time': self._blocked_time}
@@ -0,0 +1,236 @@
+from collections import deque
+from datetime import datetime
+import threading
+import numpy as np
+import pytz
+from .WeatherReportSimulator import Simulator
+
+
+class ReportChunk:
+    """Weather reports written to the database together, with their primary keys and the
+    primary keys of their flights. Chunks are shared by successive snapshots, and the entries
+    of a chunk are only built once."""
+
+    def __init__(self, ids, flight_ids, reports: Simulator.ReportBatch):
+        """Creates a new chunk.
+
+        :param ids: Array of the primary keys of the reports.
+        :param flight_ids: Array of the primary keys of the flights of the reports.
+        :param reports: ReportBatch of the reports, in time order.
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.flight_ids = np.asarray(flight_ids, dtype=np.int64)
+        self.reports = reports
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def after(self, time: datetime):
+        """Returns the reports of this chunk received after the given time.
+
+        :return: This chunk if all of its reports are after the time, otherwise a new chunk,
+                 which is empty if none of them are.
+        """
+        start = int(np.searchsorted(self.reports.time, np.datetime64(time, 'us'), side='right'))
+        if start == 0:
+            return self
+        return ReportChunk(self.ids[start:], self.flight_ids[start:], self.reports[start:])
+
+    def entries(self):
+        """Returns the reports of this chunk as dictionaries shaped like model_to_dict of WeatherReport."""
+        with self._lock:
+            if self._entries is None:
+                reports = self.reports
+                self._entries = [
+                    {'id': db_id, 'time': time.replace(tzinfo=pytz.UTC), 'latitude': lat,
+                     'longitude': lon, 'altitude': alt, 'wind_x': wind_x, 'wind_y': wind_y,
+                     'tke': tke, 'flight': flight_id}
+                    for db_id, flight_id, time, lat, lon, alt, wind_x, wind_y, tke in zip(
+                        self.ids.tolist(), self.flight_ids.tolist(), reports.time.tolist(),
+                        reports.lat.tolist(), reports.lon.tolist(), reports.alt.tolist(),
+                        reports.wind_x.tolist(), reports.wind_y.tolist(), reports.tke.tolist())]
+            return self._entries
+
+    def entries_after(self, db_id: int):
+        """Returns the entries of the reports of this chunk with a primary key greater than the given one."""
+        return self.entries()[int(np.searchsorted(self.ids, db_id, side='right')):]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class Snapshot:
+    """State of a running simulation after one write to the database, in the shape returned
+    by the query view. A snapshot is never changed once it is published.
+
+    Besides the state itself, a snapshot records what changed since the previous snapshot, so
+    that clients can be sent only the changes since a snapshot they have already seen. Primary
+    keys are allocated in increasing order, so rows with a key above the largest key of an
+    earlier snapshot are new since then.
+    """
+
+    # Fields of the flights sent to clients which already have the rest of the flight
+    POSITION_FIELDS = ('id', 'latitude', 'longitude', 'altitude', 'bearing')
+
+    def __init__(self, cursor: str, time: datetime, flights, report_chunks, airports: dict,
+                 aircraft: dict, max_flight_id: int, removed_flight_ids, expired_report_ids):
+        """Creates a new snapshot.
+
+        :param cursor: String identifying this snapshot.
+        :param time: Simulated time of the snapshot.
+        :param flights: List of dictionaries of the active flights, shaped like model_to_dict of Flight.
+        :param report_chunks: ReportChunks of the reports which have not expired, in time order.
+        :param airports: Dictionary from primary keys to dictionaries of airports.
+        :param aircraft: Dictionary from primary keys to dictionaries of aircraft types.
+        :param max_flight_id: Largest primary key of any flight written so far.
+        :param removed_flight_ids: Primary keys of the flights completed since the previous snapshot.
+        :param expired_report_ids: Primary keys of the reports expired since the previous snapshot.
+        """
+        self._cursor = cursor
+        self._time = time
+        self._flights = tuple(flights)
+        self._report_chunks = tuple(report_chunks)
+        self._airports = dict(airports)
+        self._aircraft = dict(aircraft)
+        self._max_flight_id = max_flight_id
+        self._max_report_id = max((int(chunk.ids[-1]) for chunk in self._report_chunks), default=0)
+        self._removed_flight_ids = tuple(removed_flight_ids)
+        self._expired_report_ids = np.asarray(expired_report_ids, dtype=np.int64)
+        self._reports = None
+        self._lock = threading.Lock()
+
+    def entries(self, table: str):
+        """Returns the entries of a table of the query view.
+
+        :param table: One of 'flights', 'reports', 'airports' or 'airplanes'.
+        :return: List of dictionaries, or None if the table name is unknown.
+        """
+        if table == 'flights':
+            return list(self._flights)
+        elif table == 'reports':
+            with self._lock:
+                if self._reports is None:
+                    self._reports = [entry for chunk in self._report_chunks
+                                     for entry in chunk.entries()]
+            return self._reports
+        elif table == 'airports':
+            return list(self._airports.values())
+        elif table == 'airplanes':
+            return list(self._aircraft.values())
+        return None
+
+    def changes(self, table: str, previous, later):
+        """Returns the changes of a table of the query view since an earlier snapshot.
+
+        :param table: One of 'flights', 'reports', 'airports' or 'airplanes'.
+        :param previous: Earlier snapshot the client has seen.
+        :param later: Snapshots published after the earlier snapshot, up to and including this one.
+        :return: Tuple containing a list of dictionaries of new and changed rows, and a list of
+                 the primary keys of removed rows, or None if the table name is unknown. Flights
+                 which the client already has only contain their POSITION_FIELDS.
+        """
+        if table == 'reports':
+            entries = [entry for chunk in self._report_chunks
+                       for entry in chunk.entries_after(previous._max_report_id)]
+            expired = np.concatenate([np.empty(0, dtype=np.int64)] +
+                                     [snapshot._expired_report_ids for snapshot in later])
+            return entries, expired[expired <= previous._max_report_id].tolist()
+        elif table == 'flights':
+            entries = [entry if entry['id'] > previous._max_flight_id
+                       else {field: entry[field] for field in self.POSITION_FIELDS}
+                       for entry in self._flights]
+            removed = [db_id for snapshot in later for db_id in snapshot._removed_flight_ids
+                       if db_id <= previous._max_flight_id]
+            return entries, removed
+        elif table in ('airports', 'airplanes'):
+            known = previous._airports if table == 'airports' else previous._aircraft
+            return [entry for entry in self.entries(table) if entry['id'] not in known], []
+        return None
+
+    @property
+    def cursor(self) -> str:
+        return self._cursor
+
+    @property
+    def time(self) -> datetime:
+        return self._time
+
+    @property
+    def report_chunks(self):
+        return self._report_chunks
+
+    @property
+    def num_reports(self):
+        return sum(len(chunk) for chunk in self._report_chunks)
+
+
+class LiveState:
+    """Latest snapshot of the running simulation, which the simulation publishes after every
+    write to the database and the views read without querying the database. The most recent
+    snapshots are kept, so that changes can be computed since any of them."""
+
+    def __init__(self, history: int=64):
+        """Creates a new LiveState.
+
+        :param history: Number of snapshots kept to compute changes since.
+        """
+        self._snapshot = None
+        self._history = deque(maxlen=history)
+        self._run = 0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def publish(self, *args, **kwargs):
+        """Creates a new snapshot and makes it the current one. Arguments are those of the
+        Snapshot constructor, except for the cursor.
+
+        :return: The new snapshot.
+        """
+        with self._lock:
+            self._version += 1
+            snapshot = Snapshot('{}.{}'.format(self._run, self._version), *args, **kwargs)
+            self._history.append(snapshot)
+            self._snapshot = snapshot
+        return snapshot
+
+    def changes(self, table: str, since: str):
+        """Returns the changes of a table of the query view since the snapshot with a given
+        cursor, as described by Snapshot.changes. If that snapshot is no longer kept, or is
+        from another simulation, every row of the table is returned instead.
+
+        :param table: One of 'flights', 'reports', 'airports' or 'airplanes'.
+        :param since: Cursor of a snapshot, or None to return every row.
+        :return: Tuple containing the list of new and changed rows, the list of primary keys of
+                 removed rows, the cursor of the current snapshot, and whether the rows replace
+                 all rows the client has. None if there is no snapshot or the table is unknown.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            history = list(self._history)
+        if snapshot is None:
+            return None
+        for i, previous in enumerate(history):
+            if previous.cursor == since:
+                changes = snapshot.changes(table, previous, history[i + 1:])
+                if changes is None:
+                    return None
+                return changes + (snapshot.cursor, False)
+        entries = snapshot.entries(table)
+        if entries is None:
+            return None
+        return entries, [], snapshot.cursor, True
+
+    def clear(self):
+        """Removes every snapshot, so that reads fall back to the database, and makes cursors
+        of earlier snapshots invalid."""
+        with self._lock:
+            self._run += 1
+            self._snapshot = None
+            self._history.clear()
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """Current snapshot, or None if no simulation has published one."""
+        return self._snapshot
+
+
+live_state = LiveState()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from netCDF4 import Dataset
+from ...WeatherReportSimulator import definitions
+from ...WeatherReportSimulator.Weather_Data.Weather_Fun import NpyDataset
+
+
+class Command(BaseCommand):
+    help = 'Converts a netCDF weather file into a directory of memory-mappable .npy arrays.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', nargs='?', default=definitions.WEATHER_DATA_DIR,
+                            help='netCDF weather file to convert')
+        parser.add_argument('destination', nargs='?', default=definitions.WEATHER_NATIVE_DIR,
+                            help='Directory to write the converted arrays to')
+
+    def handle(self, *args, **options):
+        with Dataset(options['source'], 'r') as data:
+            NpyDataset.convert(data, options['destination'])
+        self.stdout.write('Converted {} to {}'.format(
+            options['source'], options['destination']))
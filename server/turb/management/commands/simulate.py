@@ -0,0 +1,38 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from ...WeatherReportSimulator.Batch import simulate
+
+
+class Command(BaseCommand):
+    help = 'Runs the simulation as fast as possible and writes its flights and weather reports ' \
+           'to compressed .npz chunks, without using the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('destination', help='Directory to write the chunks to')
+        parser.add_argument('--hours', type=float, default=24,
+                            help='Simulated time to run for in hours')
+        parser.add_argument('--time-per-update', type=float, default=300,
+                            help='Simulated time per iteration in seconds')
+        parser.add_argument('--flight-time', type=float, default=10,
+                            help='Expected time between flights in seconds')
+        parser.add_argument('--report-time', type=float, default=20,
+                            help='Expected time between weather reports in seconds')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of worker processes to run the simulation on')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed of the simulation')
+        parser.add_argument('--chunk-size', type=int, default=2 ** 20,
+                            help='Number of weather reports per chunk')
+
+    def handle(self, *args, **options):
+        def progress(current_time, num_reports):
+            self.stdout.write('{}: {} reports written'.format(current_time, num_reports))
+
+        metadata = simulate(options['destination'], timedelta(hours=options['hours']),
+                            timedelta(seconds=options['time_per_update']),
+                            options['flight_time'], options['report_time'],
+                            options['processes'], options['seed'], options['chunk_size'],
+                            progress)
+        self.stdout.write('Simulated {} to {} in {:.1f}s: {} flights and {} reports written to {}'.format(
+            metadata['start_time'], metadata['stop_time'], metadata['elapsed'],
+            metadata['flights'], metadata['reports'], options['destination']))
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turb', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airport',
+            name='airport_code',
+            field=models.CharField(db_index=True, max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='flight',
+            name='active',
+            field=models.BooleanField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='weatherreport',
+            name='time',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
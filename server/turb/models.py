@@ -11,7 +11,7 @@ class Aircraft(models.Model):
 
 class Airport(models.Model):
     id = models.AutoField(primary_key=True)
-    airport_code = models.CharField(max_length=3)
+    airport_code = models.CharField(max_length=3, db_index=True)
     airport_name = models.TextField()
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
@@ -30,13 +30,13 @@ class Flight(models.Model):
     altitude = models.DecimalField(max_digits=9, decimal_places=1)
     bearing = models.DecimalField(max_digits=9, decimal_places=6)
     aircraft = models.ForeignKey(Aircraft, on_delete=models.CASCADE)
-    active = models.BooleanField()
+    active = models.BooleanField(db_index=True)
     identifier = models.TextField()
 
 
 class WeatherReport(models.Model):
     id = models.AutoField(primary_key=True)
-    time = models.DateTimeField()
+    time = models.DateTimeField(db_index=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     altitude = models.DecimalField(max_digits=9, decimal_places=1)
@@ -50,6 +50,10 @@ svg.call(zoom);
 
 var planeString = "";
 
+// Live entries of each polled table by id, and the cursor of the last response for each table
+var liveEntries = {};
+var cursors = {};
+
 var reportTooltip = d3.tip()
   .attr("class", "d3-tip")
   .offset([-12, 0])
@@ -178,13 +182,54 @@ function setMapData(map) {
  */
 function updateData(reports, aircraft) {
   if (reports) {
-    makeQuery(-1, 1, 'reports', makeTurbulence);
+    makeDeltaQuery('reports', makeTurbulence);
   }
   if (aircraft) {
-    makeQuery(-1, 1, 'flights', makeFlights);
+    makeDeltaQuery('flights', makeFlights);
   }
 }
 
+/**
+ * Makes call to retrieve the changes to a table since the last call, and applies them to the
+ * entries held for that table
+ * @param table the type of table from which to retrieve information
+ * @param callback the function to call with all current entries of the table
+ */
+function makeDeltaQuery(table, callback) {
+  var xhttp = new XMLHttpRequest();
+  var url = "http://127.0.0.1:8000/query";
+  var args = {
+    "table": table
+  };
+  if (cursors[table] != null) {
+    args["since"] = cursors[table];
+  }
+  url = url + queryString(args);
+  xhttp.onreadystatechange = processRequest;
+
+  function processRequest() {
+    if (xhttp.readyState === 4 && xhttp.status === 200) {
+      var response = JSON.parse(xhttp.response);
+      // Without a cursor the server sent the whole table
+      if (response.reset || response.cursor == null || !(table in liveEntries)) {
+        liveEntries[table] = {};
+      }
+      var entries = liveEntries[table];
+      (response.removed || []).forEach(function(id) {
+        delete entries[id];
+      });
+      // Changed flights only contain their position, which is merged into the known flight
+      response.entries.forEach(function(entry) {
+        entries[entry.id] = Object.assign(entries[entry.id] || {}, entry);
+      });
+      cursors[table] = response.cursor;
+      callback(Object.values(entries));
+    }
+  }
+  xhttp.open("GET", url, true);
+  xhttp.send();
+}
+
 /**
  * Makes call to retrieve information from server
  * @param max the maximum number of rows of information to receive back
@@ -1,6 +1,397 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from django.test import TestCase
+from datetime import datetime, timedelta
+import io
+import os
+import tempfile
+from unittest import mock
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+import numpy as np
 
-# Create your tests here.
+from . import db_interface
+from .live_state import LiveState, ReportChunk
+from .models import Flight, WeatherReport
+from .views import SimulationView
+from .WeatherReportSimulator import Simulator, definitions
+from .WeatherReportSimulator.Simulator import FlightGenerator, FlightSimulator, \
+    WeatherReportGenerator, WeatherReportSimulator
+from .WeatherReportSimulator.Weather_Data.Weather_Fun import LevelTable, WeatherModel
+
+
+class ConstantWeather:
+    """Weather model stub which has the same weather everywhere."""
+
+    def get_weather_batch(self, lats, lons, heights, times):
+        shape = np.shape(lats)
+        return np.full(shape, 0.5), np.full(shape, 10.0), np.full(shape, -5.0), \
+            np.ones(shape, dtype=bool)
+
+    def close(self):
+        pass
+
+
+def make_weather_data(seed: int=0) -> dict:
+    """Creates a small weather dataset on a one degree grid, with the variables and coordinates of
+    the weather files, whose geopotential heights increase with the level."""
+    rng = np.random.default_rng(seed)
+    lons, lats = np.meshgrid(np.arange(-130.0, -59.0), np.arange(20.0, 56.0))
+    times = 1900000.0 + 3 * np.arange(4)
+    shape = (len(times), 5) + lats.shape
+    hgt = np.linspace(500, 12000, 5)[None, :, None, None] + rng.uniform(-100, 100, shape)
+    return {'time': times, 'level': np.linspace(1000, 200, 5), 'lat': lats, 'lon': lons,
+            'tke': rng.uniform(0, 1, shape), 'uwnd': rng.normal(0, 10, shape),
+            'vwnd': rng.normal(0, 10, shape), 'hgt': hgt}
+
+
+def make_simulator(flight_time: float, report_time: float, seed: int=0) -> WeatherReportSimulator:
+    """Creates a simulator like get_simulator, over constant weather."""
+    flight_seed, report_seed = np.random.SeedSequence(seed).spawn(2)
+    flight_generator = FlightGenerator(timedelta(seconds=flight_time),
+                                       rng=np.random.default_rng(flight_seed))
+    report_generator = WeatherReportGenerator(ConstantWeather(), timedelta(seconds=report_time),
+                                              np.random.default_rng(report_seed))
+    return WeatherReportSimulator(FlightSimulator(datetime(2017, 8, 1), flight_generator),
+                                  report_generator, timedelta(hours=1))
+
+
+class WeatherReportSimulatorTests(SimpleTestCase):
+
+    def test_reports_are_sent_by_active_flights(self):
+        # Reports are rarer than ticks, so most ticks carry a report drawn in an earlier tick
+        sim = make_simulator(10, 300)
+        num_reports = 0
+        for _ in range(500):
+            sim.progress(timedelta(seconds=100))
+            active = set(sim.flight_table.ids.tolist())
+            for flight_id in sim.new_reports.flight_id.tolist():
+                self.assertIn(flight_id, active)
+            num_reports += len(sim.new_reports)
+        self.assertGreater(num_reports, 100)
+
+    def test_restored_simulation_continues_identically(self):
+        sim = make_simulator(10, 30)
+        # Long enough for flights to land while their reports are retained
+        for _ in range(200):
+            sim.progress(timedelta(seconds=100))
+        state = io.BytesIO()
+        sim.save_state(state)
+        expected = []
+        for _ in range(20):
+            sim.progress(timedelta(seconds=100))
+            expected.append(sim.new_reports)
+        # Flight ids are drawn from a class counter, so the runs must not be interleaved
+        state.seek(0)
+        restored = make_simulator(10, 30, seed=1)
+        restored.load_state(state)
+        senders = set(restored.flight_table.ids.tolist()) | \
+            {flight.id for flight in restored.landed_flights}
+        self.assertTrue(set(restored.current_reports.flight_id.tolist()) <= senders)
+        for reports in expected:
+            restored.progress(timedelta(seconds=100))
+            np.testing.assert_array_equal(restored.new_reports.flight_id, reports.flight_id)
+            np.testing.assert_array_equal(restored.new_reports.time, reports.time)
+        np.testing.assert_array_equal(restored.flight_table.ids, sim.flight_table.ids)
+
+
+class AliasSamplerTests(SimpleTestCase):
+
+    def test_samples_follow_weights(self):
+        weights = np.array([0, 1, 2, 3, 4, 0.5, 0, 7.25])
+        sampler = Simulator.AliasSampler(weights)
+        n = 400000
+        counts = np.bincount(sampler.sample(n, np.random.default_rng(0)), minlength=len(weights))
+        expected = weights / np.sum(weights)
+        np.testing.assert_array_equal(counts[weights == 0], 0)
+        # Within five standard deviations of the expected count of each index
+        tolerance = 5 * np.sqrt(n * expected * (1 - expected))
+        self.assertTrue(np.all(np.abs(counts - n * expected) <= tolerance))
+        self.assertIsInstance(sampler.sample(rng=np.random.default_rng(0)), int)
+
+    def test_invalid_weights_are_rejected(self):
+        for weights in ([1, -1, 2], [0, 0], []):
+            with self.assertRaises(ValueError):
+                Simulator.AliasSampler(weights)
+
+
+class WeatherModelTests(SimpleTestCase):
+
+    def test_batch_matches_scalar_lookups(self):
+        data = make_weather_data()
+        model = WeatherModel(data, data, data, data)
+        rng = np.random.default_rng(1)
+        n = 500
+        lats = rng.uniform(15, 60, n)
+        lons = rng.uniform(-135, -55, n)
+        heights = rng.uniform(0, 13000, n)
+        start = datetime(1800, 1, 1) + timedelta(hours=float(data['time'][0]))
+        times = [start + timedelta(hours=float(hours)) for hours in rng.uniform(-1, 10, n)]
+        tke, uwnd, vwnd, valid = model.get_weather_batch(lats, lons, heights, times)
+        self.assertTrue(0 < np.count_nonzero(valid) < n)
+        for k in range(n):
+            weather = model.get_weather(lats[k], lons[k], heights[k], times[k])
+            if weather is None:
+                self.assertFalse(valid[k])
+                self.assertTrue(np.isnan(tke[k]))
+            else:
+                self.assertTrue(valid[k])
+                np.testing.assert_allclose(weather, (tke[k], uwnd[k], vwnd[k]))
+
+    def test_values_at_grid_points_are_not_interpolated(self):
+        data = make_weather_data()
+        model = WeatherModel(data, data, data, data)
+        t, level, i, j = 2, 3, 10, 20
+        time = datetime(1800, 1, 1) + timedelta(hours=float(data['time'][t]))
+        weather = model.get_weather(data['lat'][i, j], data['lon'][i, j], data['hgt'][t, level, i, j],
+                                    time)
+        np.testing.assert_allclose(weather, [data[name][t, level, i, j]
+                                             for name in ('tke', 'uwnd', 'vwnd')])
+
+
+    def test_datasets_must_share_time_steps(self):
+        data = make_weather_data()
+        shifted = dict(data, time=data['time'] + 3)
+        with self.assertRaises(ValueError):
+            WeatherModel(data, data, shifted, data)
+
+
+class LevelTableTests(SimpleTestCase):
+
+    def test_invalid_columns_are_outside_the_weather(self):
+        hgt = np.ma.masked_array(np.tile(np.array([100.0, 1000, 5000])[:, None, None], (1, 1, 3)))
+        hgt[:, 0, 1] = [5000, 1000, 100]
+        hgt[1, 0, 2] = np.ma.masked
+        low, high, coeff, bottom, top = LevelTable(hgt).bracket(np.arange(3), np.full(3, 3000.0))
+        np.testing.assert_array_equal((low[0], high[0]), (1, 2))
+        self.assertAlmostEqual(coeff[0], 0.5)
+        np.testing.assert_array_equal(bottom, [100, np.nan, np.nan])
+        np.testing.assert_array_equal(top, [5000, np.nan, np.nan])
+
+    def test_weather_is_missing_at_invalid_columns(self):
+        data = make_weather_data()
+        data['hgt'][1, :, 10, 20] = data['hgt'][1, ::-1, 10, 20]
+        model = WeatherModel(data, data, data, data)
+        start = datetime(1800, 1, 1) + timedelta(hours=float(data['time'][0]))
+        for i, j, hours, valid in ((10, 20, 1, False), (10, 20, 7, True), (10, 21, 1, True)):
+            weather = model.get_weather(data['lat'][i, j], data['lon'][i, j], 6000,
+                                        start + timedelta(hours=hours))
+            self.assertEqual(weather is not None, valid)
+
+
+class SaveFlightStatesTests(TestCase):
+
+    def setUp(self):
+        db_interface.clear_identity_map()
+
+    def tearDown(self):
+        db_interface.clear_identity_map()
+
+    def make_flight(self, start: datetime) -> Simulator.Flight:
+        return Simulator.Flight(Simulator.Airport('SEA', 'SEA', 47.45, -122.31, 130),
+                                Simulator.Airport('PDX', 'PDX', 45.59, -122.6, 9),
+                                start, start + timedelta(hours=1), Simulator.AIRCRAFT['Boeing 747'],
+                                47, -122.4, 6000, 180)
+
+    def make_reports(self, time: datetime, flight: Simulator.Flight) -> Simulator.ReportBatch:
+        return Simulator.ReportBatch([np.datetime64(time, 'us')], [flight.id], [47], [-122.4],
+                                     [6000], [10], [-5], [0.5])
+
+    def test_reports_of_flights_written_earlier(self):
+        start = datetime(2017, 8, 1)
+        flight = self.make_flight(start)
+        empty = Simulator.ReportBatch.empty()
+        db_interface.save_flight_states(db_interface.flight_states([flight], []), empty)
+        db_interface.save_flight_states(db_interface.flight_states([], [flight]), empty)
+        db_interface.clear_identity_map()
+        report_ids, flight_ids = db_interface.save_flight_states([], self.make_reports(start, flight))
+        self.assertEqual(flight_ids, [flight.db_id])
+        self.assertEqual(WeatherReport.objects.get(id=report_ids[0]).flight_id, flight.db_id)
+        self.assertFalse(Flight.objects.get(id=flight.db_id).active)
+
+    def test_reports_of_unknown_flights_are_rejected(self):
+        reports = Simulator.ReportBatch([np.datetime64(datetime(2017, 8, 1), 'us')], [-1], [47],
+                                        [-122.4], [6000], [10], [-5], [0.5])
+        with self.assertRaises(ValueError):
+            db_interface.save_flight_states([], reports)
+        self.assertEqual(WeatherReport.objects.count(), 0)
+
+    def test_completed_flights_stay_mapped_until_purged(self):
+        start = datetime(2017, 8, 1)
+        flight = self.make_flight(start)
+        db_interface.save_flight_states(db_interface.flight_states([flight], []),
+                                        self.make_reports(start, flight))
+        db_interface.save_flight_states(db_interface.flight_states([], [flight]),
+                                        Simulator.ReportBatch.empty())
+        self.assertEqual(db_interface.purge(start - timedelta(minutes=1)), (0, 0))
+        # A late report is resolved through the identity map, without a query
+        with CaptureQueriesContext(connection) as queries:
+            db_interface.save_flight_states([], self.make_reports(start + timedelta(minutes=1),
+                                                                  flight))
+        self.assertFalse([query for query in queries.captured_queries
+                          if query['sql'].startswith('SELECT')])
+        self.assertEqual(db_interface.purge(start + timedelta(minutes=1)), (2, 1))
+        self.assertNotIn(flight.id, db_interface._identity_map.flights)
+
+    def test_simulation_ticks(self):
+        # Reports are rarer than ticks, so most ticks carry a report drawn in an earlier tick
+        sim = make_simulator(300, 300)
+        for _ in range(200):
+            sim.progress(timedelta(seconds=150))
+            db_interface.save_flight_states(
+                db_interface.flight_states(sim.current_flights, sim.removed_flights),
+                sim.new_reports)
+            db_interface.purge(sim.current_time - sim.keep_time)
+        self.assertEqual(set(Flight.objects.filter(active=True).values_list('identifier', flat=True)),
+                         {flight.identifier for flight in sim.current_flights})
+        self.assertEqual(WeatherReport.objects.count(), sim.num_current_reports)
+        self.assertGreater(Flight.objects.filter(active=False).count(), 0)
+
+
+class DatabaseWriterTests(TestCase):
+
+    def setUp(self):
+        db_interface.clear_identity_map()
+
+    def tearDown(self):
+        db_interface.clear_identity_map()
+
+    def make_deltas(self, sim: WeatherReportSimulator, count: int) -> list:
+        deltas = []
+        for _ in range(count):
+            sim.progress(timedelta(seconds=600))
+            deltas.append(db_interface.TickDelta(
+                sim.current_time, db_interface.flight_states(sim.current_flights, sim.removed_flights),
+                sim.new_reports, None))
+        return deltas
+
+    def test_failed_write_is_retried_with_the_next_one(self):
+        sim = make_simulator(60, 10)
+        writer = db_interface.DatabaseWriter(state=LiveState())
+        save_flight_states = db_interface.save_flight_states
+        failures = [OperationalError('database is locked')]
+
+        def fail_once(*args):
+            if failures:
+                raise failures.pop()
+            return save_flight_states(*args)
+
+        deltas = self.make_deltas(sim, 2)
+        with mock.patch.object(db_interface, 'save_flight_states', side_effect=fail_once):
+            writer._write(deltas[:1])
+            self.assertEqual(writer.metrics['unwritten_ticks'], 1)
+            self.assertEqual(Flight.objects.count(), 0)
+            writer._write(deltas[1:])
+        metrics = writer.metrics
+        self.assertEqual((metrics['errors'], metrics['unwritten_ticks'], metrics['ticks']), (1, 0, 2))
+        self.assertEqual(WeatherReport.objects.count(),
+                         sum(len(delta.reports) for delta in deltas))
+        self.assertEqual(set(Flight.objects.filter(active=True).values_list('identifier', flat=True)),
+                         {flight.identifier for flight in sim.current_flights})
+
+    def test_permanently_failing_writes_are_dropped(self):
+        sim = make_simulator(60, 10)
+        state = LiveState()
+        writer = db_interface.DatabaseWriter(state=state, max_retries=2)
+        deltas = self.make_deltas(sim, 5)
+        with mock.patch.object(db_interface, 'save_flight_states',
+                               side_effect=OperationalError('disk I/O error')):
+            for k in range(3):
+                writer._write(deltas[k:k + 1])
+            metrics = writer.metrics
+            self.assertEqual((metrics['errors'], metrics['unwritten_ticks'], metrics['dropped_ticks']),
+                             (3, 0, 3))
+        # Errors other than OperationalError are not retried
+        with mock.patch.object(db_interface, 'save_flight_states', side_effect=ValueError):
+            writer._write(deltas[3:4])
+            self.assertEqual((writer.metrics['unwritten_ticks'], writer.metrics['dropped_ticks']),
+                             (0, 4))
+        self.assertIsNone(state.snapshot)
+        writer._write(deltas[4:])
+        self.assertEqual(writer.metrics['ticks'], 1)
+        self.assertEqual(WeatherReport.objects.count(), len(deltas[4].reports))
+        self.assertEqual({flight['identifier'] for flight in state.snapshot.entries('flights')},
+                         {flight.identifier for flight in sim.current_flights})
+
+
+class LiveStateTests(SimpleTestCase):
+
+    start = datetime(2017, 8, 1)
+
+    def make_chunk(self, ids, minutes) -> ReportChunk:
+        n = len(ids)
+        times = [np.datetime64(self.start + timedelta(minutes=minute), 'us') for minute in minutes]
+        return ReportChunk(ids, np.ones(n), Simulator.ReportBatch(
+            times, np.ones(n, dtype=np.int64), np.full(n, 47.0), np.full(n, -122.0),
+            np.full(n, 6000.0), np.zeros(n), np.zeros(n), np.zeros(n)))
+
+    def make_flight(self, db_id: int, lat: float) -> dict:
+        return {'id': db_id, 'start_time': self.start, 'origin': 1, 'destination': 1,
+                'latitude': lat, 'longitude': -122.0, 'altitude': 6000.0, 'bearing': 90.0,
+                'aircraft': 1, 'active': True, 'identifier': str(db_id)}
+
+    def publish(self, state: LiveState, minute: int, flights, chunks, airport_ids, removed, expired):
+        airports = {db_id: {'id': db_id} for db_id in airport_ids}
+        return state.publish(self.start + timedelta(minutes=minute), flights, chunks, airports,
+                             {1: {'id': 1}}, max(flight['id'] for flight in flights), removed, expired)
+
+    def publish_three(self, state: LiveState) -> list:
+        """Publishes three snapshots. The second adds reports 3 and 4, flights 3 and 4 and
+        airport 2, moves flight 1, and removes report 1 and flight 2. The third removes report 2,
+        and report 3 and flight 4, which appeared after the first snapshot."""
+        chunk = self.make_chunk([1, 2], [1, 2])
+        new_chunk = self.make_chunk([3, 4], [3, 4])
+        return [
+            self.publish(state, 2, [self.make_flight(1, 40), self.make_flight(2, 41)], [chunk],
+                         [1], [], []),
+            self.publish(state, 4, [self.make_flight(1, 42), self.make_flight(3, 43),
+                                    self.make_flight(4, 44)],
+                         [chunk.after(self.start + timedelta(minutes=1)), new_chunk], [1, 2], [2],
+                         [1]),
+            self.publish(state, 6, [self.make_flight(1, 45), self.make_flight(3, 46)],
+                         [new_chunk.after(self.start + timedelta(minutes=3))], [1, 2], [4], [2, 3])]
+
+    def test_changes_since_an_earlier_snapshot(self):
+        state = LiveState()
+        first, _, last = self.publish_three(state)
+        entries, expired, cursor, reset = state.changes('reports', first.cursor)
+        self.assertEqual(([entry['id'] for entry in entries], expired, cursor, reset),
+                         ([4], [1, 2], last.cursor, False))
+        entries, removed, _, reset = state.changes('flights', first.cursor)
+        self.assertEqual(entries, [{'id': 1, 'latitude': 45, 'longitude': -122.0, 'altitude': 6000.0,
+                                    'bearing': 90.0}, self.make_flight(3, 46)])
+        self.assertEqual((removed, reset), ([2], False))
+        entries, removed, _, _ = state.changes('airports', first.cursor)
+        self.assertEqual((entries, removed), ([{'id': 2}], []))
+        # Nothing changed since the current snapshot
+        self.assertEqual(state.changes('reports', last.cursor), ([], [], last.cursor, False))
+        self.assertIsNone(state.changes('unknown', first.cursor))
+
+    def test_every_row_is_sent_once_the_cursor_is_no_longer_kept(self):
+        state = LiveState(history=2)
+        first, second, last = self.publish_three(state)
+        entries, expired, cursor, reset = state.changes('reports', first.cursor)
+        self.assertEqual(([entry['id'] for entry in entries], expired, cursor, reset),
+                         ([4], [], last.cursor, True))
+        entries, removed, _, reset = state.changes('flights', second.cursor)
+        self.assertEqual(([entry['id'] for entry in entries], removed, reset), ([1, 3], [4], False))
+        state.clear()
+        self.assertIsNone(state.changes('flights', last.cursor))
+        current = self.publish(state, 8, [self.make_flight(1, 47)], [], [1], [], [])
+        self.assertEqual(state.changes('flights', last.cursor),
+                         ([self.make_flight(1, 47)], [], current.cursor, True))
+
+
+class SimulationViewTests(SimpleTestCase):
+
+    def test_unreadable_checkpoint_is_reported(self):
+        with tempfile.TemporaryDirectory() as checkpoint:
+            with open(os.path.join(checkpoint, 'engine.json'), 'w') as file:
+                file.write('{')
+            with mock.patch.object(definitions, 'CHECKPOINT_DIR', checkpoint):
+                response = self.client.post('/simulation/', {
+                    'restore': 'Restore', 'flight_time': 10, 'report_time': 20, 'update_time': 1,
+                    'time_per_update': 100})
+        self.assertContains(response, 'Could not restore the saved simulation')
+        self.assertEqual(SimulationView.sim_state, 'stopped')
@@ -7,9 +7,11 @@ from django.views.generic import TemplateView
 from django.core import serializers
 from django.utils import timezone
 from .models import *
-from .WeatherReportSimulator import Simulator
-from .WeatherReportSimulator.Multithreading import SimulationThreadManager
+from .WeatherReportSimulator import Simulator, definitions
+from .WeatherReportSimulator.Multiprocessing import SimulationProcessManager
 from .db_interface import *
+from .live_state import live_state
+import os
 
 
 class SimulationForm(forms.Form):
@@ -36,11 +38,13 @@ class SimulationView(TemplateView):
                           'cur_flight_time': SimulationView.cur_flight_time,
                           'cur_report_time': SimulationView.cur_report_time,
                           'cur_update_time': SimulationView.cur_update_time,
-                          'cur_time_per_update': SimulationView.cur_time_per_update
+                          'cur_time_per_update': SimulationView.cur_time_per_update,
+                          'can_restore': os.path.isdir(definitions.CHECKPOINT_DIR)
                       })
 
     def post(self, request: HttpRequest) -> HttpResponse:
         form = SimulationForm(request.POST)
+        error = None
         if 'start_stop' in request.POST:
             if SimulationView.sim_state in ['running', 'paused']:
                 SimulationView.simulation_thread.unpause()
@@ -58,11 +62,33 @@ class SimulationView(TemplateView):
                     SimulationView.cur_update_time = update_time
                     time_per_update = form.cleaned_data['time_per_update']
                     SimulationView.cur_time_per_update = time_per_update
-                    t = SimulationThreadManager(
-                        flight_time, report_time, update_time, time_per_update, 1)
+                    t = SimulationProcessManager(
+                        flight_time, report_time, update_time, time_per_update,
+                        checkpoint=definitions.CHECKPOINT_DIR)
                     t.start()
                     SimulationView.simulation_thread = t
                     SimulationView.sim_state = 'running'
+        elif 'restore' in request.POST:
+            if SimulationView.sim_state == 'stopped' and os.path.isdir(definitions.CHECKPOINT_DIR):
+                if form.is_valid():
+                    update_time = form.cleaned_data['update_time']
+                    SimulationView.cur_update_time = update_time
+                    time_per_update = form.cleaned_data['time_per_update']
+                    SimulationView.cur_time_per_update = time_per_update
+                    # Only reached once the previous simulation has stopped, which waits for
+                    # its final checkpoint to be saved
+                    try:
+                        t = SimulationProcessManager(
+                            None, None, update_time, time_per_update,
+                            checkpoint=definitions.CHECKPOINT_DIR, restore=True)
+                    except (OSError, ValueError, KeyError) as e:
+                        error = 'Could not restore the saved simulation: {}'.format(e)
+                    else:
+                        SimulationView.cur_flight_time = t.flight_time
+                        SimulationView.cur_report_time = t.report_time
+                        t.start()
+                        SimulationView.simulation_thread = t
+                        SimulationView.sim_state = 'running'
         elif 'pause' in request.POST:
             if SimulationView.sim_state == 'running':
                 SimulationView.sim_state = 'paused'
@@ -76,7 +102,9 @@ class SimulationView(TemplateView):
                           'cur_flight_time': SimulationView.cur_flight_time,
                           'cur_report_time': SimulationView.cur_report_time,
                           'cur_update_time': SimulationView.cur_update_time,
-                          'cur_time_per_update': SimulationView.cur_time_per_update
+                          'cur_time_per_update': SimulationView.cur_time_per_update,
+                          'can_restore': os.path.isdir(definitions.CHECKPOINT_DIR),
+                          'error': error
                       })
 
 
@@ -122,6 +150,29 @@ def query(request: HttpRequest) -> HttpResponse:
     start_index = safe_cast(request.GET.get('start', 0), int, 0)
     id = safe_cast(request.GET.get('id', -1), int, -1)
     table_name = request.GET.get('table', '')
+    since = request.GET.get('since', None)
+
+    # Serve the running simulation from memory, and only query the database without one.
+    # Clients which pass the cursor of the previous response only receive the changes since it
+    if since is not None:
+        changes = live_state.changes(table_name, since)
+        if changes is not None:
+            entries, removed, cursor, reset = changes
+            return JsonResponse({"entries": entries, "removed": removed, "cursor": cursor,
+                                 "reset": reset})
+    snapshot = live_state.snapshot
+    if snapshot is not None:
+        entries = snapshot.entries(table_name)
+        if entries is None:
+            return JsonResponse({"entries": []})
+        if id < 0 and start_index == 0 and max_entries < 0:
+            return JsonResponse({"entries": entries, "cursor": snapshot.cursor})
+        if id >= 0:
+            entries = [entry for entry in entries if entry['id'] == id]
+        if max_entries < 0:
+            return JsonResponse({"entries": entries[start_index:]})
+        else:
+            return JsonResponse({"entries": entries[start_index:start_index + max_entries]})
 
     if table_name == 'airplanes':
         entries = Aircraft.objects